@@ -8,180 +8,210 @@ from dotenv import load_dotenv
 
 # Importar nuestros módulos
 from src.modules.x_client import x_bot
-from src.modules.cognitive import brain
+from src.modules.cognitive import brain, is_valid_decision
 from src.modules.mood_engine import mood_engine
 from src.modules.memory_service import memory_service
-from src.modules.state_machine import state_machine
-from src.core.database import get_db_session
-from src.core.models import InteractionLog, MoodLog
+from src.modules.state_machine import state_machine, ActionPlan
+from src.modules.tweet_record import TweetRecord
+from src.modules.work_queue import ActionQueue, drain, ACTIONS_PER_CYCLE, ACTION_WORKERS
+from src.modules.interaction_index import handled_index
+from src.modules.host_feed import host_feed
+from src.modules.outbox import outbox_worker
+from src.modules.scheduler import poll_scheduler, CHECK_INTERVAL_MIN, CHECK_INTERVAL_MAX, SCHEDULER_ADAPTIVE
+from sqlalchemy import select
+from src.core.database import get_async_db_session
+from src.core.mood_rollup import run_maintenance_loop as run_mood_maintenance
+from src.core.models import InteractionLog, OutboxTask
+from tenacity import retry, stop_after_attempt, wait_exponential
 
 # Cargar configuración
 load_dotenv()
 TARGET_HOST = os.getenv("X_USERNAME") # El usuario al que hacemos "Sombra"
 
-# Configuración de Tiempos (Desde variables de entorno con fallback)
-CHECK_INTERVAL_MIN = int(os.getenv("CHECK_INTERVAL_MIN", 300))
-CHECK_INTERVAL_MAX = int(os.getenv("CHECK_INTERVAL_MAX", 900))
+# Configuración de Tiempos (CHECK_INTERVAL_MIN/MAX acotan el intervalo adaptativo, ver scheduler.py)
+# Plazo por etapa de percepción (X, DB, embeddings); una etapa lenta no bloquea el ciclo
+PERCEPTION_STAGE_TIMEOUT = float(os.getenv("PERCEPTION_STAGE_TIMEOUT", 30))
+# Separación mínima entre publicaciones de un mismo ciclo (segundos, con jitter)
+ACTION_POST_SPACING = float(os.getenv("ACTION_POST_SPACING", 20))
+NEUTRAL_MOOD = {"valence": 0.0, "arousal": 0.0, "description": "Analítico y Distante (Neutral)."}
 
 def log(msg: str):
     """Log con timestamp ISO para seguimiento explícito."""
     now_str = datetime.now().isoformat()
     print(f"[{now_str}] {msg}")
 
-def interaction_exists(tweet_id: str) -> bool:
-    """Verifica si ya reaccionamos a un tweet específico."""
-    if not tweet_id:
-        return False
-    session_gen = get_db_session()
-    session = next(session_gen)
-    try:
-        return session.query(InteractionLog).filter_by(tweet_id=tweet_id).first() is not None
-    except Exception as e:
-        print(f"❌ Error verificando DB: {e}")
-        return False
-    finally:
-        session.close()
-
-def last_daily_post_date() -> date | None:
+async def last_daily_post_date() -> date | None:
     """Devuelve la fecha del último daily_post registrado."""
-    session_gen = get_db_session()
-    session = next(session_gen)
+    async with get_async_db_session() as session:
+        try:
+            last_created = await session.scalar(
+                select(InteractionLog.created_at)
+                .filter_by(action_type="daily_post")
+                .order_by(InteractionLog.created_at.desc())
+                .limit(1)
+            )
+            if last_created:
+                return last_created.date()
+            return None
+        except Exception as e:
+            print(f"❌ Error consultando último daily: {e}")
+            return None
+
+async def run_stage(name: str, coro, default, timeout: float = PERCEPTION_STAGE_TIMEOUT):
+    """
+    Ejecuta una etapa del ciclo con plazo propio. Ante timeout o error loguea y
+    devuelve `default` para que el resto del ciclo continúe.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.time()
     try:
-        last_daily = (
-            session.query(InteractionLog)
-            .filter_by(action_type="daily_post")
-            .order_by(InteractionLog.created_at.desc())
-            .first()
-        )
-        if last_daily:
-            return last_daily.created_at.date()
-        return None
+        result = await asyncio.wait_for(coro, timeout=timeout)
+        log(f"⏱️ Etapa '{name}' completada en {loop.time() - started:.2f}s")
+        return result
+    except asyncio.TimeoutError:
+        log(f"⏱️ Etapa '{name}' superó {timeout:.0f}s; se continúa sin ella.")
     except Exception as e:
-        print(f"❌ Error consultando último daily: {e}")
-        return None
-    finally:
-        session.close()
-
-def extract_text(tweet) -> str:
-    """Obtiene el texto de un tweet de forma segura."""
-    if tweet is None:
-        return ""
-    if hasattr(tweet, "text"):
-        return tweet.text
-    if isinstance(tweet, dict):
-        return tweet.get("text", "")
-    return str(tweet)
-
-def extract_tweet_id(tweet) -> str | None:
+        log(f"❌ Error en etapa '{name}': {e}")
+    return default
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=5), reraise=True)
+async def record_action(build_rows):
     """
-    Intenta obtener el ID del tweet asociado.
-    Compatible con notificaciones de Twikit que no usan 'id' directamente.
+    Registra la acción publicada en una sola transacción (reintenta si la DB falla).
+    `build_rows` crea filas nuevas en cada intento: no se reutilizan objetos de una sesión fallida.
     """
-    if tweet is None:
-        return None
-    candidates = [
-        "id",
-        "tweet_id",
-        "status_id",
-        "target_status_id",
-        "conversation_id",
-    ]
-    for attr in candidates:
-        if hasattr(tweet, attr):
-            val = getattr(tweet, attr, None)
-            if val:
-                return str(val)
-        if isinstance(tweet, dict) and attr in tweet and tweet[attr]:
-            return str(tweet[attr])
-    # Algunos objetos encapsulan el tweet en otro atributo
-    for nested in ["tweet", "status"]:
-        if hasattr(tweet, nested):
-            nested_obj = getattr(tweet, nested)
-            nested_id = extract_tweet_id(nested_obj)
-            if nested_id:
-                return nested_id
-        if isinstance(tweet, dict) and nested in tweet:
-            nested_id = extract_tweet_id(tweet[nested])
-            if nested_id:
-                return nested_id
-    return None
+    async with get_async_db_session() as session:
+        session.add_all(build_rows())
+        await session.commit()
+
+_post_lock = asyncio.Lock()
+_last_post_at = 0.0
+
+async def wait_post_slot():
+    """Espacia las publicaciones de los workers (OpSec: nada de ráfagas simultáneas)."""
+    global _last_post_at
+    async with _post_lock:
+        wait = _last_post_at + ACTION_POST_SPACING * random.uniform(1.0, 1.5) - time.monotonic()
+        if _last_post_at and wait > 0:
+            log(f"⏳ Esperando {wait:.0f}s antes de la siguiente publicación...")
+            await asyncio.sleep(wait)
+        _last_post_at = time.monotonic()
 
 async def run_autonomy_cycle():
     log(f"\n🌀 --- INICIANDO CICLO DE AUTONOMÍA ---")
     
     # ---------------------------------------------------------
-    # 1. PERCEPCIÓN: Obtener contexto (host, menciones, daily)
+    # 1. PERCEPCIÓN: Obtener contexto (host, menciones, daily, mood) en paralelo
     # ---------------------------------------------------------
     now = datetime.now(timezone.utc)
+    cycle_started = time.monotonic()
 
-    # Host: buscar último tweet no respondido
-    host_tweet = None
-    try:
-        log(f"👁️ Escaneando perfil de @{TARGET_HOST}...")
-        tweets = await x_bot.client.search_tweet(f"from:{TARGET_HOST}", product="Latest")
-        if tweets:
-            candidate = tweets[0]
-            cid = extract_tweet_id(candidate)
-            if not interaction_exists(cid):
-                host_tweet = candidate
-            log(f"🔍 Host candidato id={cid}, texto='{extract_text(candidate)[:80]}'")
-    except Exception as e:
-        log(f"❌ Error leyendo X (host): {e}")
+    # Etapas independientes: el tiempo del ciclo ≈ la etapa más lenta, no la suma.
+    # Si el daily no se puede verificar a tiempo se asume hecho (evita publicarlo dos veces).
+    # Si la precarga del índice de interacciones falló al arrancar, se reintenta aquí
+    raw_host, raw_mentions, last_daily, current_mood, _ = await asyncio.gather(
+        run_stage("host", host_feed.fetch_new(), []),
+        run_stage("menciones", x_bot.get_new_mentions(), []),
+        run_stage("daily", last_daily_post_date(), now.date()),
+        run_stage("mood", mood_engine.get_current_mood(), NEUTRAL_MOOD),
+        run_stage("índice", handled_index.warm(), None) if not handled_index.warmed else asyncio.sleep(0),
+    )
+
+    # Dependen de la percepción: verificación en lote contra el índice de interacciones
+    # manejadas y, en paralelo, embeddings de los candidatos (el RAG los toma de la caché)
+    # Cada objeto de Twikit se normaliza una sola vez; el resto del ciclo usa el record
+    host_candidates = [TweetRecord.coerce(t) for t in raw_host]
+    mention_candidates = [TweetRecord.coerce(n) for n in raw_mentions]
+    candidate_ids = [t.id for t in (*host_candidates, *mention_candidates)]
+    poll_scheduler.observe(candidate_ids)
+    candidate_texts = [t.text for t in (*host_candidates, *mention_candidates) if t.text]
+    handled, _ = await asyncio.gather(
+        handled_index.handled_among(candidate_ids),
+        run_stage("embeddings", memory_service.get_embeddings(candidate_texts), None)
+        if candidate_texts else asyncio.sleep(0),
+    )
+    log(f"👁️ Percepción completada en {time.monotonic() - cycle_started:.2f}s")
+
+    host_tweets = []
+    for t in host_candidates:
+        if t.id not in handled:
+            host_tweets.append(t)
+        log(f"🔍 Host candidato id={t.id}, texto='{t.text[:80]}'")
 
-    # Menciones: obtener notificaciones y filtrar no respondidas
     mentions = []
-    try:
-        notifications = await x_bot.get_my_latest_mentions(limit=10)
-        for n in notifications:
-            tid = extract_tweet_id(n)
-            log(f"🔔 Notificación recibida raw={n}")
-            if tid and not interaction_exists(tid):
-                mentions.append(n)
-                log(f"✅ Mención candidata id={tid}, texto='{extract_text(n)[:80]}'")
-            else:
-                log(f"⏭️ Notificación ignorada id={tid}")
-    except Exception as e:
-        log(f"⚠️ Error obteniendo menciones: {e}")
+    for m in mention_candidates:
+        log(f"🔔 Mención recibida {m}")
+        if m.id and m.id not in handled:
+            mentions.append(m)
+            log(f"✅ Mención candidata id={m.id}, texto='{m.text[:80]}'")
+        else:
+            log(f"⏭️ Mención ignorada id={m.id}")
 
-    allow_daily = last_daily_post_date() != now.date()
+    allow_daily = last_daily != now.date()
 
-    plan = state_machine.decide_action(
-        host_tweet=host_tweet,
+    # Todos los candidatos puntuados a la cola; los workers la vacían con presupuesto
+    queue = ActionQueue()
+    plans = state_machine.plan_actions(
+        host_tweets=host_tweets,
         mentions=mentions,
         allow_daily=allow_daily,
         current_time=now,
     )
+    for plan in plans:
+        queue.push(plan, key=plan.target_tweet.id if plan.target_tweet else plan.action_type)
 
-    if not plan:
+    if not queue:
         log("💤 Sin acciones pendientes en este ciclo.")
+        await host_feed.advance(host_candidates, pending_ids=[])
+        await x_bot.advance_mentions(pending_ids=[])
         return
 
-    target_text = extract_text(plan.target_tweet) if plan.target_tweet else plan.target_text
-    target_id = extract_tweet_id(plan.target_tweet) if plan.target_tweet else None
+    log(f"📋 Cola de trabajo: {len(queue)} acciones (presupuesto={ACTIONS_PER_CYCLE}, workers={ACTION_WORKERS})")
+    # Estado compartido entre workers: cada acción parte del mood que dejó la anterior
+    mood_state = dict(current_mood)
+    completed = await drain(
+        queue, lambda plan: execute_plan(plan, mood_state),
+        workers=ACTION_WORKERS, budget=ACTIONS_PER_CYCLE,
+    )
+    log(f"🏁 Acciones completadas en el ciclo: {completed}")
+
+    # Los watermarks (host, notificaciones) no pasan de un tweet planificado que sigue sin atender
+    pending = {
+        tid for tid in (p.target_tweet.id for p in plans if p.target_tweet is not None)
+        if tid not in handled_index
+    }
+    await host_feed.advance(host_candidates, pending_ids=pending)
+    await x_bot.advance_mentions(pending_ids=pending)
+
+async def execute_plan(plan: ActionPlan, current_mood: dict) -> bool:
+    """RAG -> DeepSeek -> Publicar -> Persistir para un plan. Devuelve True si se publicó."""
+    target_text = plan.target_tweet.text if plan.target_tweet else plan.target_text
+    target_id = plan.target_tweet.id if plan.target_tweet else None
     log(f"🎬 Plan seleccionado: tipo={plan.action_type}, should_quote={plan.should_quote}, target_id={target_id}, motivo='{plan.reason}'")
 
     # ---------------------------------------------------------
-    # 2. ESTADO INTERNO: Consultar Mood y RAG
+    # 2. ESTADO INTERNO: Mood (leído en la percepción) y RAG
     # ---------------------------------------------------------
-    current_mood = mood_engine.get_current_mood()
     log(f"🌡️ Mood Actual: {current_mood['description']} (V:{current_mood['valence']}, A:{current_mood['arousal']})")
 
-    relevant_memories = memory_service.retrieve_context(target_text)
+    relevant_memories = await run_stage("rag", memory_service.retrieve_context(target_text), [])
     log(f"📚 Recuerdos recuperados: {len(relevant_memories)}")
+    log(f"🧮 Caché de embeddings: {memory_service.cache.stats()}")
     
     # ---------------------------------------------------------
     # 3. COGNICIÓN: Generar Inversión Bizarra con DeepSeek
     # ---------------------------------------------------------
     log(f"🧠 Pensando respuesta invertida ({plan.reason})...")
-    decision = brain.generate_bizarro_thought(
+    decision = await brain.generate_bizarro_thought_async(
         target_tweet=target_text,
         mood_context=f"Estado: {current_mood['description']}",
-        memories=relevant_memories
+        memories=relevant_memories,
+        action_type=plan.action_type,
     )
 
     if not decision:
         log("❌ El cerebro no produjo respuesta (JSON inválido o error API).")
-        return
+        return False
 
     final_content = decision.get('tweet_content')
     thought_process = decision.get('thought_process')
@@ -189,15 +219,16 @@ async def run_autonomy_cycle():
     log(f"💡 Pensamiento: {thought_process}")
     log(f"🗣️ Decisión: {final_content}")
 
-    if not final_content or len(final_content) > 280:
+    if not is_valid_decision(decision):
         log("⚠️ Tweet inválido (vacío o muy largo). Abortando.")
-        return
+        return False
 
     # ---------------------------------------------------------
     # 4. ACCIÓN: Publicar en X
     # ---------------------------------------------------------
     action_log_type = "daily_post" if plan.action_type == "daily" else "shadow_quote" if plan.should_quote else "shadow_reply"
     try:
+        await wait_post_slot()
         if plan.action_type == "daily":
             log("🗓️ Publicando DAILY POST")
             await x_bot.post_tweet(final_content)
@@ -211,54 +242,51 @@ async def run_autonomy_cycle():
             
         log("🚀 TWEET PUBLICADO EXITOSAMENTE")
         
+        # Ya publicado: nunca volver a responder este target en este proceso
+        handled_index.mark_handled(target_id)
+
         # ---------------------------------------------------------
-        # 5. PERSISTENCIA: Guardar Log y Actualizar Mood
+        # 5. PERSISTENCIA: mood en memoria (write-behind) y una transacción corta (log + outbox)
         # ---------------------------------------------------------
-        session_gen_save = get_db_session() 
-        session_save = next(session_gen_save)
-        
-        try:
-            interaction_log = InteractionLog(
-                tweet_id=target_id,
-                action_type=action_log_type,
-                input_context=target_text,
-                generated_content=final_content,
-                mood_state=current_mood,
-                reward_score=0.0 
-            )
-            session_save.add(interaction_log)
-            
-            delta_v = decision.get('new_valence_delta', 0)
-            delta_a = decision.get('new_arousal_delta', 0)
+        mood_before = dict(current_mood)
+        current_mood.update(mood_engine.apply(
+            decision.get('new_valence_delta', 0),
+            decision.get('new_arousal_delta', 0),
+            stimulus_type="tweet_posted",
+            description=f"Reacción ({action_log_type}) a {target_id or 'daily_post'}",
+        ))
 
-            new_valence = max(-1.0, min(1.0, current_mood['valence'] + delta_v))
-            new_arousal = max(-1.0, min(1.0, current_mood['arousal'] + delta_a))
-            
-            mood_log = MoodLog(
-                valence=new_valence,
-                arousal=new_arousal,
-                stimulus_type="tweet_posted",
-                description=f"Reacción ({action_log_type}) a {target_id or 'daily_post'}"
-            )
-            session_save.add(mood_log)
-            
-            memory_service.save_memory(
-                content=f"Dije: {final_content}", 
-                source_type="self_reflection"
-            )
-            
-            session_save.commit()
-            log(f"💾 Persistencia completada correctamente. Última acción={action_log_type}, target_id={target_id or 'daily_post'}")
-            
+        def build_rows():
+            return [
+                InteractionLog(
+                    tweet_id=target_id,
+                    action_type=action_log_type,
+                    input_context=target_text,
+                    generated_content=final_content,
+                    mood_state=mood_before,
+                    reward_score=0.0
+                ),
+                # Trabajo lento (embedding + memoria) fuera del camino crítico, con reintentos
+                OutboxTask(
+                    task_type="save_memory",
+                    payload={"content": f"Dije: {final_content}", "source_type": "self_reflection"},
+                ),
+            ]
+
+        try:
+            await record_action(build_rows)
         except Exception as db_e:
-            log(f"❌ Error guardando en DB: {db_e}")
-            session_save.rollback()
-        finally:
-            session_save.close()
+            log(f"🚨 Tweet publicado pero NO registrado en DB ({type(db_e).__name__}: {db_e}). "
+                f"tipo={action_log_type}, target_id={target_id}, contenido='{final_content}'")
+            return True
+        outbox_worker.wake()
+        log(f"💾 Persistencia completada correctamente. Última acción={action_log_type}, target_id={target_id or 'daily_post'}")
+        return True
         
     except Exception as e:
         log(f"❌ Error crítico en fase de Acción/Persistencia: {type(e).__name__}: {e}")
         traceback.print_exc()
+        return False
 
 async def main_loop():
     """Bucle infinito con Jitter y manejo de errores"""
@@ -273,6 +301,35 @@ async def main_loop():
         print("🚨 Error crítico en login inicial. Verifica cookies.json.")
         return
 
+    await handled_index.warm()
+
+    # Tareas de fondo; se cancelan y se esperan juntas al detener el sistema
+    background = []
+    # Réplica vectorial local (opcional): se sincroniza en segundo plano
+    if memory_service.replica:
+        background.append(asyncio.create_task(memory_service.replica.run_sync_loop()))
+    # Outbox: memoria y demás trabajo diferido de las acciones publicadas
+    background.append(asyncio.create_task(outbox_worker.run_loop()))
+    # Mood: los cambios en memoria se vuelcan a mood_logs por lotes
+    background.append(asyncio.create_task(mood_engine.run_flush_loop()))
+    # Rollups horarios/diarios del mood y retención de mood_logs
+    background.append(asyncio.create_task(run_mood_maintenance()))
+
+    try:
+        await _run_forever()
+    finally:
+        await stop_background(background)
+        # Al detener el sistema no se pierden los cambios de mood pendientes
+        await mood_engine.flush()
+
+async def stop_background(tasks: list):
+    """Cancela las tareas de fondo y espera a que terminen (sin cortarlas a medias al salir)."""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def _run_forever():
+    """Ciclos de autonomía separados por el intervalo del scheduler."""
     while True:
         try:
             await run_autonomy_cycle()
@@ -281,7 +338,11 @@ async def main_loop():
             traceback.print_exc()
         
         # Dormir aleatoriamente
-        sleep_time = random.randint(CHECK_INTERVAL_MIN, CHECK_INTERVAL_MAX)
+        # Intervalo adaptativo: corto con actividad reciente, largo en horas tranquilas
+        if SCHEDULER_ADAPTIVE and poll_scheduler.profile_stale():
+            await poll_scheduler.refresh_profile()
+        sleep_time = poll_scheduler.next_interval()
+        log(f"📈 Tasa de llegadas estimada: {poll_scheduler.expected_rate() * 3600:.2f}/h")
         next_run_ts = time.time() + sleep_time
         next_run_local = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(next_run_ts))
         log(f"💤 Durmiendo {sleep_time} segundos (próximo ciclo local: {next_run_local})...")
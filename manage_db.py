@@ -0,0 +1,55 @@
+"""
+Tareas de mantenimiento de la base de datos.
+
+Uso:
+    python manage_db.py init            # extensión vector, tablas, índices e índice ANN
+    python manage_db.py rebuild-index   # reconstruye el índice ANN de semantic_memory
+    python manage_db.py backfill-compact  # rellena embedding_compact (MEMORY_STORAGE_MODE halfvec/binary)
+    python manage_db.py rollup-mood     # agrega mood_logs en mood_rollups y poda según MOOD_RETENTION_DAYS
+"""
+import argparse
+import asyncio
+from sqlalchemy import text
+from src.core.database import Base, async_engine
+from src.core import models  # noqa: F401  (registra las tablas en Base.metadata)
+from src.core.mood_rollup import maintain_moods
+from src.core.vector_index import ensure_index, rebuild_index, backfill_compact, ensure_compact_column
+
+
+def _create_missing_indexes(sync_conn):
+    """create_all no añade índices nuevos a tablas que ya existían."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+async def init_db():
+    async with async_engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_missing_indexes)
+    await ensure_compact_column()
+    print("✅ Tablas verificadas.")
+    await ensure_index()
+
+
+COMMANDS = {
+    "init": init_db,
+    "rebuild-index": rebuild_index,
+    "backfill-compact": backfill_compact,
+    "rollup-mood": maintain_moods,
+}
+
+
+async def run(command: str):
+    try:
+        await COMMANDS[command]()
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de la DB del Gemelo Bizarro")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    asyncio.run(run(args.command))
@@ -1,5 +1,8 @@
 import os
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from dotenv import load_dotenv
 
@@ -11,13 +14,60 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("❌ DATABASE_URL no está configurada en el archivo .env")
 
+# Configuración del pool (compartida por el motor síncrono y el asíncrono)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+# Caché de sentencias preparadas de asyncpg (0 la desactiva, necesario tras PgBouncer en modo transacción)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 100))
+
+
+def _async_database_url(url: str) -> str:
+    """
+    Deriva la URL del driver asíncrono (asyncpg) a partir de DATABASE_URL.
+    Se puede forzar otra con ASYNC_DATABASE_URL.
+    """
+    override = os.getenv("ASYNC_DATABASE_URL")
+    if override:
+        return override
+    parsed = make_url(url)
+    if parsed.drivername in ("postgresql", "postgres", "postgresql+psycopg2", "postgresql+psycopg"):
+        parsed = parsed.set(drivername="postgresql+asyncpg")
+    return parsed.render_as_string(hide_password=False)
+
+
 # Crear el motor de conexión
 # pool_pre_ping=True ayuda a manejar desconexiones silenciosas de la DB
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+engine = create_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+)
 
 # Fábrica de sesiones
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Motor asíncrono para el bucle principal (no bloquea el event loop de twikit)
+async_engine = create_async_engine(
+    _async_database_url(DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    connect_args={"statement_cache_size": DB_STATEMENT_CACHE_SIZE},
+)
+# Nota: no se registra el codec binario de pgvector en asyncpg; los tipos Vector/HALFVEC
+# de SQLAlchemy ya serializan a texto y asyncpg usa E/S de texto para tipos desconocidos.
+
+
+# Fábrica de sesiones asíncronas (expire_on_commit=False: los objetos siguen legibles tras commit)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
 # Clase Base para los modelos ORM
 class Base(DeclarativeBase):
     pass
@@ -28,4 +78,14 @@ def get_db_session():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@asynccontextmanager
+async def get_async_db_session():
+    """Equivalente asíncrono de get_db_session: `async with get_async_db_session() as session:`."""
+    session = AsyncSessionLocal()
+    try:
+        yield session
+    finally:
+        await session.close()
@@ -1,10 +1,11 @@
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from sqlalchemy import String, Text, DateTime, Float, func
+from typing import Optional, List, Dict, Any, NamedTuple
+from sqlalchemy import String, Text, DateTime, Float, Index, func, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import Vector, HALFVEC
 from src.core.database import Base
+from src.core.vector_index import MEMORY_COMPACT_DIMENSIONS
 
 class SemanticMemory(Base):
     __tablename__ = "semantic_memory"
@@ -12,7 +13,13 @@ class SemanticMemory(Base):
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     content: Mapped[str] = mapped_column(Text, nullable=False)
     # Vector de 1536 dimensiones (Estándar DeepSeek/OpenAI)
+    # Índice ANN (HNSW/IVFFlat) gestionado en src/core/vector_index.py
     embedding: Mapped[List[float]] = mapped_column(Vector(1536))
+    # Copia reducida (truncada + normalizada, float16) para el primer paso de búsqueda
+    # en los modos 'halfvec'/'binary'; NULL en modo 'full'. Diferida: no viaja en los SELECT.
+    embedding_compact: Mapped[Optional[List[float]]] = mapped_column(
+        HALFVEC(MEMORY_COMPACT_DIMENSIONS), nullable=True, deferred=True
+    )
     
     # Metadatos flexibles para filtros (ej. autor, fecha original)
     metadata_: Mapped[Dict[str, Any]] = mapped_column("metadata", JSONB, server_default='{}')
@@ -20,15 +27,32 @@ class SemanticMemory(Base):
     source_type: Mapped[str] = mapped_column(String(50)) # 'host_tweet', 'reflection', etc.
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # Filtros de retrieve_context: tipo de origen + ventana temporal
+        Index("ix_semantic_memory_source_created", "source_type", "created_at"),
+        Index("ix_semantic_memory_created_at", "created_at"),
+        # Predicados de contención (@>) sobre metadata
+        Index("ix_semantic_memory_metadata", "metadata", postgresql_using="gin",
+              postgresql_ops={"metadata": "jsonb_path_ops"}),
+    )
+
     def __repr__(self):
         return f"<Memory(id={self.id}, source={self.source_type}, content='{self.content[:30]}...')>"
 
 
+class MemoryHit(NamedTuple):
+    """Resultado ligero de retrieve_context: sin el vector de 1536 floats."""
+    id: int
+    content: str
+    source_type: str
+    distance: float  # distancia coseno (0 = idéntico)
+
+
 class InteractionLog(Base):
     __tablename__ = "interaction_logs"
 
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
-    tweet_id: Mapped[Optional[str]] = mapped_column(String(30), nullable=True)
+    tweet_id: Mapped[Optional[str]] = mapped_column(String(30), nullable=True, index=True)
     action_type: Mapped[str] = mapped_column(String(50)) # 'tweet', 'reply', 'like'
     
     input_context: Mapped[Optional[str]] = mapped_column(Text)
@@ -57,7 +81,85 @@ class MoodLog(Base):
     stimulus_type: Mapped[str] = mapped_column(String(100)) # Qué causó el cambio
     description: Mapped[Optional[str]] = mapped_column(Text) # Descripción legible
     
+    # Indexado: los rollups y la poda recorren mood_logs por rango de fechas
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+    def __repr__(self):
+        return f"<Mood(V={self.valence}, A={self.arousal}, stimulus={self.stimulus_type})>"
+
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    # sha256 del texto normalizado + modelo de embedding
+    text_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(100), primary_key=True)
+    # Sin dimensión fija: depende del modelo/dimensiones configurados
+    embedding: Mapped[List[float]] = mapped_column(Vector())
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
     def __repr__(self):
-        return f"<Mood(V={self.valence}, A={self.arousal}, stimulus={self.stimulus_type})>"
\ No newline at end of file
+        return f"<EmbeddingCache(hash={self.text_hash[:12]}, model={self.model})>"
+
+
+class AgentState(Base):
+    __tablename__ = "agent_state"
+
+    # Estado clave/valor del agente (watermarks de ingesta, cursores, etc.)
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[str] = mapped_column(Text)
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self):
+        return f"<AgentState({self.key}={self.value})>"
+
+
+class OutboxTask(Base):
+    __tablename__ = "outbox_tasks"
+
+    # Trabajo diferido registrado en la misma transacción que la acción (ej. 'save_memory')
+    id: Mapped[int] = mapped_column(primary_key=True)
+    task_type: Mapped[str] = mapped_column(String(50))
+    payload: Mapped[Dict[str, Any]] = mapped_column(JSONB)
+    status: Mapped[str] = mapped_column(String(20), server_default="pending")  # pending | done | failed
+    attempts: Mapped[int] = mapped_column(server_default="0")
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # El worker solo busca tareas pendientes y vencidas
+        Index("ix_outbox_tasks_due", "next_attempt_at", postgresql_where=text("status = 'pending'")),
+    )
+
+    def __repr__(self):
+        return f"<Outbox(id={self.id}, type={self.task_type}, status={self.status}, attempts={self.attempts})>"
+
+
+class MoodRollup(Base):
+    __tablename__ = "mood_rollups"
+
+    # Agregado del mood por intervalo (ver src/core/mood_rollup.py); sobrevive a la poda de mood_logs
+    period: Mapped[str] = mapped_column(String(10), primary_key=True)  # hour | day
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)  # UTC
+    samples: Mapped[int] = mapped_column()
+    valence_avg: Mapped[float] = mapped_column(Float)
+    valence_min: Mapped[float] = mapped_column(Float)
+    valence_max: Mapped[float] = mapped_column(Float)
+    arousal_avg: Mapped[float] = mapped_column(Float)
+    arousal_min: Mapped[float] = mapped_column(Float)
+    arousal_max: Mapped[float] = mapped_column(Float)
+    # {stimulus_type: número de cambios}
+    stimulus_counts: Mapped[Dict[str, int]] = mapped_column(JSONB, server_default='{}')
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self):
+        return f"<MoodRollup({self.period} {self.bucket_start}, n={self.samples}, V={self.valence_avg}, A={self.arousal_avg})>"
@@ -0,0 +1,152 @@
+import os
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Sequence
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.core.database import get_async_db_session
+from src.core.models import MoodLog, MoodRollup
+from src.core.state_store import get_state, set_state
+
+# Días de mood_logs crudos que se conservan (0 = no podar); el histórico queda en mood_rollups
+MOOD_RETENTION_DAYS = int(os.getenv("MOOD_RETENTION_DAYS", 90))
+# Cada cuánto el bot recalcula los rollups y poda (segundos; 0 = solo con manage_db)
+MOOD_ROLLUP_INTERVAL = int(os.getenv("MOOD_ROLLUP_INTERVAL", 3600))
+ROLLUP_PERIODS = ("hour", "day")
+# Inicio del último día agregado: se recalcula desde ahí (el día en curso sigue abierto)
+ROLLUP_WATERMARK_KEY = "mood_rollup_watermark"
+# Margen hacia atrás del watermark: cambios de mood volcados tarde (write-behind de MoodEngine)
+ROLLUP_OVERLAP = timedelta(days=1)
+# Filas por INSERT ... ON CONFLICT: 10 parámetros por fila, asyncpg admite hasta 32767 por sentencia
+ROLLUP_UPSERT_CHUNK = 1000
+
+
+def bucket_start(ts: datetime, period: str) -> datetime:
+    """Inicio (UTC) del intervalo `period` que contiene a `ts`."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    ts = ts.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0) if period == "day" else ts
+
+
+def build_rollups(period: str, stats: Iterable[Sequence], stimulus_counts: Iterable[Sequence]) -> List[dict]:
+    """
+    Filas para mood_rollups a partir de dos agregaciones SQL:
+    - stats: (bucket, samples, v_avg, v_min, v_max, a_avg, a_min, a_max)
+    - stimulus_counts: (bucket, stimulus_type, n)
+    """
+    counts = {}
+    for bucket, stimulus_type, n in stimulus_counts:
+        counts.setdefault(bucket, {})[stimulus_type or "unknown"] = int(n)
+    rows = []
+    for bucket, samples, v_avg, v_min, v_max, a_avg, a_min, a_max in stats:
+        rows.append({
+            "period": period,
+            "bucket_start": bucket if bucket.tzinfo else bucket.replace(tzinfo=timezone.utc),
+            "samples": int(samples),
+            "valence_avg": round(float(v_avg), 4),
+            "valence_min": float(v_min),
+            "valence_max": float(v_max),
+            "arousal_avg": round(float(a_avg), 4),
+            "arousal_min": float(a_min),
+            "arousal_max": float(a_max),
+            "stimulus_counts": counts.get(bucket, {}),
+        })
+    return rows
+
+
+def upsert_statements(rows: List[dict], chunk_size: int = ROLLUP_UPSERT_CHUNK):
+    """Upserts de mood_rollups en lotes de `chunk_size` filas (primer arranque con mucho histórico)."""
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        stmt = pg_insert(MoodRollup).values(chunk)
+        yield stmt.on_conflict_do_update(
+            index_elements=[MoodRollup.period, MoodRollup.bucket_start],
+            set_={
+                **{col: stmt.excluded[col] for col in chunk[0] if col not in ("period", "bucket_start")},
+                "updated_at": func.now(),
+            },
+        )
+
+
+async def _aggregate(session, period: str, since: datetime | None) -> List[dict]:
+    # date_trunc sobre la hora UTC (independiente de la zona horaria de la sesión)
+    bucket = func.date_trunc(period, func.timezone("UTC", MoodLog.created_at)).label("bucket")
+    window = [MoodLog.created_at >= since] if since else []
+    stats = await session.execute(
+        select(
+            bucket, func.count(),
+            func.avg(MoodLog.valence), func.min(MoodLog.valence), func.max(MoodLog.valence),
+            func.avg(MoodLog.arousal), func.min(MoodLog.arousal), func.max(MoodLog.arousal),
+        ).where(*window).group_by(bucket)
+    )
+    stimulus = await session.execute(
+        select(bucket, MoodLog.stimulus_type, func.count()).where(*window).group_by(bucket, MoodLog.stimulus_type)
+    )
+    return build_rollups(period, stats.all(), stimulus.all())
+
+
+async def rollup_moods() -> int:
+    """
+    Recalcula los rollups por hora y por día desde el último día agregado (upsert:
+    idempotente) y avanza el watermark. Devuelve cuántos intervalos se escribieron.
+    """
+    watermark = await get_state(ROLLUP_WATERMARK_KEY)
+    since = datetime.fromisoformat(watermark) - ROLLUP_OVERLAP if watermark else None
+    next_watermark = bucket_start(datetime.now(timezone.utc), "day")
+
+    written = 0
+    async with get_async_db_session() as session:
+        for period in ROLLUP_PERIODS:
+            rows = await _aggregate(session, period, since)
+            # Todos los lotes en la misma transacción: el watermark solo avanza si entran todos
+            for stmt in upsert_statements(rows):
+                await session.execute(stmt)
+            written += len(rows)
+        await session.commit()
+
+    await set_state(ROLLUP_WATERMARK_KEY, next_watermark.isoformat())
+    print(f"📊 Rollups de mood actualizados: {written} intervalos (desde {since or 'el inicio'}).")
+    return written
+
+
+async def prune_mood_logs(retention_days: int = MOOD_RETENTION_DAYS) -> int:
+    """
+    Borra mood_logs anteriores al horizonte de retención que ya estén agregados.
+    Siempre conserva el último registro (MoodEngine arranca desde él).
+    """
+    if retention_days <= 0:
+        return 0
+    watermark = await get_state(ROLLUP_WATERMARK_KEY)
+    if not watermark:
+        print("⚠️ Sin rollups de mood todavía; no se poda mood_logs.")
+        return 0
+    rolled_up_until = datetime.fromisoformat(watermark) - ROLLUP_OVERLAP
+    cutoff = min(datetime.now(timezone.utc) - timedelta(days=retention_days), rolled_up_until)
+
+    async with get_async_db_session() as session:
+        last_id = select(func.max(MoodLog.id)).scalar_subquery()
+        result = await session.execute(
+            delete(MoodLog).where(MoodLog.created_at < cutoff, MoodLog.id < last_id)
+        )
+        await session.commit()
+    print(f"🧹 mood_logs podados: {result.rowcount} filas anteriores a {cutoff:%Y-%m-%d}.")
+    return result.rowcount
+
+
+async def maintain_moods():
+    """Rollups + retención (comando `rollup-mood` de manage_db y tarea periódica del bot)."""
+    await rollup_moods()
+    await prune_mood_logs()
+
+
+async def run_maintenance_loop(interval: int = MOOD_ROLLUP_INTERVAL):
+    """Tarea de fondo: mantiene los rollups al día sin bloquear el ciclo de autonomía."""
+    if interval <= 0:
+        return
+    while True:
+        try:
+            await maintain_moods()
+        except Exception as e:
+            print(f"⚠️ Error actualizando rollups de mood: {e}")
+        await asyncio.sleep(interval)
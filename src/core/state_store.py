@@ -0,0 +1,47 @@
+from typing import Iterable, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from src.core.database import get_async_db_session
+from src.core.models import AgentState
+
+
+async def get_state(key: str) -> str | None:
+    """Valor persistido para `key` (None si no existe o la DB falla)."""
+    try:
+        async with get_async_db_session() as session:
+            return await session.scalar(select(AgentState.value).where(AgentState.key == key))
+    except Exception as e:
+        print(f"⚠️ Error leyendo estado '{key}': {e}")
+        return None
+
+
+async def set_state(key: str, value: str) -> bool:
+    """Upsert de `key`; devuelve False si no se pudo guardar."""
+    stmt = pg_insert(AgentState).values(key=key, value=value)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[AgentState.key],
+        set_={"value": stmt.excluded.value, "updated_at": func.now()},
+    )
+    try:
+        async with get_async_db_session() as session:
+            await session.execute(stmt)
+            await session.commit()
+        return True
+    except Exception as e:
+        print(f"⚠️ Error guardando estado '{key}': {e}")
+        return False
+
+
+def contiguous_watermark(marks: Iterable[Tuple[int, str | None]], pending_ids: Iterable[str], current: int | None):
+    """
+    Nuevo watermark para una ingesta incremental: recorre (marca, id) en orden
+    ascendente y avanza mientras el elemento no esté pendiente. Así un elemento
+    que no se atendió en el ciclo (presupuesto, error) se vuelve a ofrecer.
+    """
+    pending = {str(tweet_id) for tweet_id in pending_ids if tweet_id}
+    mark = current
+    for value, tweet_id in marks:
+        if tweet_id is not None and str(tweet_id) in pending:
+            break
+        mark = value if mark is None else max(mark, value)
+    return mark
@@ -0,0 +1,180 @@
+import os
+import math
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.core.database import async_engine
+
+# Índice ANN sobre semantic_memory (gestionado aquí, no en models.py,
+# porque el método, la columna indexada y sus parámetros son configurables).
+MEMORY_INDEX_NAME = "ix_semantic_memory_embedding_ann"
+MEMORY_INDEX_METHOD = os.getenv("MEMORY_INDEX_METHOD", "hnsw").lower()  # 'hnsw' | 'ivfflat'
+
+# Modo de almacenamiento del primer paso de búsqueda:
+# - 'full':    índice sobre embedding vector(1536) (comportamiento original)
+# - 'halfvec': índice sobre embedding_compact halfvec(N) (dimensiones reducidas, float16)
+# - 'binary':  índice sobre binary_quantize(embedding_compact)::bit(N) (distancia Hamming)
+# En los modos compactos el resultado se reordena con la distancia coseno exacta
+# sobre `embedding`, que sigue siendo la fuente de verdad.
+MEMORY_STORAGE_MODE = os.getenv("MEMORY_STORAGE_MODE", "full").lower()
+MEMORY_COMPACT_DIMENSIONS = int(os.getenv("MEMORY_COMPACT_DIMENSIONS", 512))
+# Candidatos del primer paso que pasan al re-rank exacto
+MEMORY_RERANK_CANDIDATES = int(os.getenv("MEMORY_RERANK_CANDIDATES", 40))
+
+# HNSW: calidad del grafo (construcción) y recall/latencia por consulta
+HNSW_M = int(os.getenv("HNSW_M", 16))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 64))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 40))
+
+# Escaneo iterativo (pgvector >= 0.8) para consultas filtradas: el índice sigue
+# devolviendo vecinos hasta completar el LIMIT tras aplicar los filtros.
+# 'off' para versiones anteriores de pgvector.
+MEMORY_ITERATIVE_SCAN = os.getenv("MEMORY_ITERATIVE_SCAN", "relaxed_order").lower()
+
+# IVFFlat: número de listas (0 = automático según filas) y listas a sondear por consulta
+IVFFLAT_LISTS = int(os.getenv("IVFFLAT_LISTS", 0))
+IVFFLAT_PROBES = int(os.getenv("IVFFLAT_PROBES", 10))
+
+if MEMORY_INDEX_METHOD not in ("hnsw", "ivfflat"):
+    raise ValueError(f"❌ MEMORY_INDEX_METHOD inválido: {MEMORY_INDEX_METHOD} (usa 'hnsw' o 'ivfflat')")
+if MEMORY_STORAGE_MODE not in ("full", "halfvec", "binary"):
+    raise ValueError(f"❌ MEMORY_STORAGE_MODE inválido: {MEMORY_STORAGE_MODE} (usa 'full', 'halfvec' o 'binary')")
+
+
+def compact_embedding(vector: list[float], dims: int = MEMORY_COMPACT_DIMENSIONS) -> list[float]:
+    """
+    Reduce un embedding de text-embedding-3 a `dims` dimensiones: truncado + normalización L2.
+    Es lo mismo que hace la API con el parámetro `dimensions` (embeddings Matryoshka),
+    así que no hace falta una segunda llamada.
+    """
+    head = vector[:dims]
+    norm = math.sqrt(sum(x * x for x in head))
+    if norm == 0:
+        return head
+    return [x / norm for x in head]
+
+
+def index_target() -> str:
+    """Expresión y opclass indexadas según el modo de almacenamiento."""
+    if MEMORY_STORAGE_MODE == "halfvec":
+        return "embedding_compact halfvec_cosine_ops"
+    if MEMORY_STORAGE_MODE == "binary":
+        return f"(binary_quantize(embedding_compact)::bit({MEMORY_COMPACT_DIMENSIONS})) bit_hamming_ops"
+    # Mismo operador que usa retrieve_context (distancia coseno, <=>)
+    return "embedding vector_cosine_ops"
+
+
+def ivfflat_lists_for(row_count: int) -> int:
+    """Regla recomendada por pgvector: filas/1000 hasta 1M, sqrt(filas) por encima."""
+    if IVFFLAT_LISTS:
+        return IVFFLAT_LISTS
+    if row_count <= 1_000_000:
+        return max(1, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+def index_ddl(name: str = MEMORY_INDEX_NAME, row_count: int = 0, concurrently: bool = False) -> str:
+    """Sentencia CREATE INDEX para el método configurado."""
+    if MEMORY_INDEX_METHOD == "hnsw":
+        params = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    else:
+        params = f"lists = {ivfflat_lists_for(row_count)}"
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name} "
+        f"ON semantic_memory USING {MEMORY_INDEX_METHOD} ({index_target()}) "
+        f"WITH ({params})"
+    )
+
+
+def search_settings(filtered: bool = False) -> list[str]:
+    """Parámetros de búsqueda por consulta (SET LOCAL: solo viven en la transacción actual)."""
+    if MEMORY_INDEX_METHOD == "hnsw":
+        ef_search = HNSW_EF_SEARCH
+        if MEMORY_STORAGE_MODE != "full":
+            # HNSW nunca devuelve más de ef_search filas: debe cubrir a todos los candidatos
+            ef_search = max(ef_search, MEMORY_RERANK_CANDIDATES)
+        settings = [f"SET LOCAL hnsw.ef_search = {ef_search}"]
+    else:
+        settings = [f"SET LOCAL ivfflat.probes = {IVFFLAT_PROBES}"]
+    if filtered and MEMORY_ITERATIVE_SCAN != "off":
+        # El orden final lo fija el re-rank exacto, así que relaxed_order es suficiente
+        settings.append(f"SET LOCAL {MEMORY_INDEX_METHOD}.iterative_scan = {MEMORY_ITERATIVE_SCAN}")
+    return settings
+
+
+async def apply_search_settings(session: AsyncSession, filtered: bool = False):
+    """Debe llamarse dentro de la misma transacción que la consulta vectorial."""
+    for stmt in search_settings(filtered):
+        await session.execute(text(stmt))
+
+
+async def _row_count(conn) -> int:
+    return (await conn.execute(text("SELECT count(*) FROM semantic_memory"))).scalar_one()
+
+
+async def ensure_index():
+    """Crea el índice ANN si no existe."""
+    async with async_engine.begin() as conn:
+        row_count = await _row_count(conn) if MEMORY_INDEX_METHOD == "ivfflat" else 0
+        await conn.execute(text(index_ddl(row_count=row_count)))
+    print(f"✅ Índice {MEMORY_INDEX_NAME} ({MEMORY_INDEX_METHOD}) verificado.")
+
+
+async def rebuild_index():
+    """
+    Reconstruye el índice sin bloquear escrituras: crea uno nuevo CONCURRENTLY,
+    elimina el anterior y renombra. Útil tras cambiar parámetros o tras cargas masivas
+    (IVFFlat calcula sus centroides con los datos existentes al construirse).
+    """
+    tmp_name = f"{MEMORY_INDEX_NAME}_new"
+    async with async_engine.connect() as conn:
+        # CREATE/DROP INDEX CONCURRENTLY no pueden ejecutarse dentro de una transacción
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        row_count = await _row_count(conn)
+        print(f"🔧 Reconstruyendo {MEMORY_INDEX_NAME} ({MEMORY_INDEX_METHOD}) sobre {row_count} filas...")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp_name}"))
+        await conn.execute(text(index_ddl(name=tmp_name, row_count=row_count, concurrently=True)))
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {MEMORY_INDEX_NAME}"))
+        await conn.execute(text(f"ALTER INDEX {tmp_name} RENAME TO {MEMORY_INDEX_NAME}"))
+    print(f"✅ Índice {MEMORY_INDEX_NAME} reconstruido.")
+
+
+async def ensure_compact_column():
+    """Añade embedding_compact a tablas creadas antes de existir la columna."""
+    async with async_engine.begin() as conn:
+        await conn.execute(text(
+            "ALTER TABLE semantic_memory ADD COLUMN IF NOT EXISTS "
+            f"embedding_compact halfvec({MEMORY_COMPACT_DIMENSIONS})"
+        ))
+
+
+async def backfill_compact(batch_size: int = 1000):
+    """
+    Migración para los modos compactos: crea la columna embedding_compact si falta,
+    la rellena por lotes a partir de `embedding` y reconstruye el índice.
+    """
+    dims = MEMORY_COMPACT_DIMENSIONS
+    await ensure_compact_column()
+
+    total = 0
+    while True:
+        # Lotes cortos: cada uno es su propia transacción y no bloquea la tabla entera
+        async with async_engine.begin() as conn:
+            result = await conn.execute(text(
+                f"""
+                UPDATE semantic_memory
+                SET embedding_compact = l2_normalize(subvector(embedding, 1, {dims}))::halfvec({dims})
+                WHERE id IN (
+                    SELECT id FROM semantic_memory
+                    WHERE embedding_compact IS NULL AND embedding IS NOT NULL
+                    ORDER BY id
+                    LIMIT :batch_size
+                )
+                """
+            ), {"batch_size": batch_size})
+        if result.rowcount == 0:
+            break
+        total += result.rowcount
+        print(f"🔁 Backfill embedding_compact: {total} filas...")
+
+    print(f"✅ Backfill completado ({total} filas).")
+    await rebuild_index()
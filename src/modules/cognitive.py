@@ -1,13 +1,46 @@
 import os
-import json
-import re
+import asyncio
 from pathlib import Path
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
+from src.modules.json_stream import DecisionStreamParser
+from src.modules.context_builder import ContextBuilder
+from src.modules.model_router import ModelRouter
+from src.modules.decision_schema import parse_decision, MAX_TWEET_CHARS
 
 # Cargar entorno si no se ha hecho
 load_dotenv()
 
+# Plazo máximo por llamada al LLM (segundos) y llamadas simultáneas permitidas
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 120))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 2))
+# Streaming con parseo incremental: permite abortar salidas inválidas o demasiado largas
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+# Reparación barata (modelo rápido) cuando la salida no cumple el esquema
+LLM_REPAIR = os.getenv("LLM_REPAIR", "1") == "1"
+LLM_REPAIR_TIMEOUT = float(os.getenv("LLM_REPAIR_TIMEOUT", 20))
+REPAIR_MAX_TOKENS = 600
+REPAIR_PROMPT = (
+    "Corrige la siguiente salida para que sea un único objeto JSON válido con las claves "
+    "tweet_content (string, máximo 280 caracteres), thought_process (string), "
+    "new_valence_delta y new_arousal_delta (números). Conserva el contenido y el tono; "
+    "si tweet_content excede el límite, acórtalo. Responde solo con el JSON.\n\n"
+    "Error: {error}\n\nSalida original:\n{raw}"
+)
+# Generación cubierta (hedging): candidatos en paralelo, gana el primero válido
+LLM_HEDGE_CANDIDATES = int(os.getenv("LLM_HEDGE_CANDIDATES", 1))
+# Segundos antes de lanzar cada candidato extra (0 = todos a la vez)
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", 0))
+
+
+def is_valid_decision(decision) -> bool:
+    """La decisión es publicable: JSON parseado con tweet_content no vacío y <= 280 caracteres."""
+    if not isinstance(decision, dict) or "error" in decision:
+        return False
+    content = decision.get("tweet_content")
+    return isinstance(content, str) and 0 < len(content.strip()) and len(content) <= MAX_TWEET_CHARS
+
+
 class CognitiveEngine:
     def __init__(self):
         self.api_key = os.getenv("DEEPSEEK_API_KEY")
@@ -27,9 +60,27 @@ class CognitiveEngine:
 
         # Inicializamos el cliente (DeepSeek es compatible con la SDK de OpenAI)
         self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
-        self.model_reasoning = "deepseek-reasoner"  # Modelo R1 (Chain of Thought)
-        # self.model_chat = "deepseek-chat"       # Modelo V3 (Rápido, para tareas simples)
+        # Cliente asíncrono para el bucle principal; el timeout de httpx es solo un respaldo
+        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, timeout=LLM_TIMEOUT + 10)
+        self.max_concurrency = LLM_MAX_CONCURRENCY
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        if LLM_HEDGE_CANDIDATES > LLM_MAX_CONCURRENCY:
+            print(f"⚠️ LLM_HEDGE_CANDIDATES={LLM_HEDGE_CANDIDATES} supera LLM_MAX_CONCURRENCY={LLM_MAX_CONCURRENCY}; "
+                  f"se usarán {LLM_MAX_CONCURRENCY} candidatos por generación.")
+        # Selección de modelo por tipo de acción y latencia observada
+        self.router = ModelRouter()
+        self.model_reasoning = self.router.reasoner_model  # Modelo R1 (Chain of Thought)
+        self.model_chat = self.router.fast_model           # Modelo V3 (Rápido, para tareas simples)
         self.system_prompt = self._load_system_prompt()
+        # Prefijo estático (cacheable por DeepSeek) + plantilla dinámica (mood/RAG)
+        self.static_prompt, self.dynamic_prompt = self._split_system_prompt(self.system_prompt)
+        # Presupuesto de tokens del prompt (tiktoken)
+        self.context_builder = ContextBuilder()
+        self.static_prompt_tokens = self.context_builder.count(self.static_prompt)
+        self.last_prompt_tokens = 0
+        # Tokens de prompt servidos desde la caché de contexto de DeepSeek
+        self.last_usage = None
+        self.usage_totals = {"prompt_tokens": 0, "cache_hit_tokens": 0, "cache_miss_tokens": 0}
 
     def _load_system_prompt(self) -> str:
         """
@@ -43,61 +94,355 @@ class CognitiveEngine:
 
     def _clean_json_response(self, content: str) -> dict:
         """
-        Limpia la respuesta del LLM si envuelve el JSON en bloques de código markdown.
-        """
-        # Eliminar bloques ```json ... ```
-        pattern = r"```json\s*(.*?)\s*```"
-        match = re.search(pattern, content, re.DOTALL)
-        if match:
-            json_str = match.group(1)
-        else:
-            # Si no hay bloques, asumir que todo el texto es JSON (o intentar parsearlo)
-            json_str = content.strip()
-            
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError:
-            print(f"⚠️ Error parseando JSON crudo: {content[:100]}...")
-            # Fallback de emergencia: devolver un diccionario vacío o error controlado
-            return {"error": "JSON_PARSE_FAILED", "raw": content}
+        Parsea la respuesta del LLM de forma tolerante (bloques ```json, texto sobrante,
+        comillas simples, objetos truncados) y la valida contra BizarroDecision.
+        Si no cumple devuelve {"error", "raw"} para que pueda repararse.
+        """
+        decision, error = parse_decision(content or "")
+        if decision is None:
+            print(f"⚠️ Respuesta inválida ({error}): {(content or '')[:100]}...")
+            return {"error": error, "raw": content}
+        # Solo los campos presentes: los consumidores aplican sus propios defaults
+        return decision.model_dump(exclude_unset=True)
 
-    def generate_bizarro_thought(self, target_tweet: str, mood_context: str, memories: list) -> dict:
+    @staticmethod
+    def _split_system_prompt(template: str) -> tuple[str, str]:
         """
-        Genera una respuesta invertida usando razonamiento profundo.
+        Separa el System Prompt en un prefijo estático y una plantilla dinámica.
+        El corte se hace al inicio de la línea con el primer placeholder ({mood_context}
+        o {rag_text}): todo lo anterior es idéntico en cada llamada y puede servirse
+        desde la caché de contexto (prefix caching) de DeepSeek.
         """
-        
-        # 1. Construir el contexto de memoria (RAG)
-        rag_text = "\n".join([f"- {m.content}" for m in memories]) if memories else "Sin recuerdos previos relevantes."
+        positions = [template.find(p) for p in ("{mood_context}", "{rag_text}") if p in template]
+        if not positions:
+            return template.format(), ""
+        cut = template.rfind("\n", 0, min(positions)) + 1
+        # format() sin argumentos resuelve las llaves escapadas ({{ }}) del prefijo
+        return template[:cut].format(), template[cut:]
+
+    def _build_messages(self, target_tweet: str, mood_context: str, memories: list) -> list:
+        """
+        Arma los mensajes de chat: el mensaje system lleva solo el prefijo estático y el
+        contexto dinámico (mood + RAG) va al mensaje de usuario, antes del tweet.
+        """
+        user_content = f"Tweet entrante del Host: '{target_tweet}'"
+        builder = self.context_builder
+
+        # 1. Tokens fijos: prefijo estático + plantilla dinámica sin recuerdos + tweet
+        reserved = (
+            self.static_prompt_tokens
+            + builder.count(self.dynamic_prompt.format(mood_context=mood_context, rag_text=""))
+            + builder.count(user_content)
+        )
+
+        # 2. Construir el contexto de memoria (RAG) dentro del presupuesto restante
+        rag_text, included = builder.build_rag_text(memories, reserved)
 
-        # 2. Definir el System Prompt (La personalidad) inyectando contexto dinámico
-        system_prompt = self.system_prompt.format(
+        # 3. Inyectar el contexto dinámico fuera del prefijo cacheable
+        dynamic_context = self.dynamic_prompt.format(
             mood_context=mood_context,
             rag_text=rag_text,
+        ).strip()
+        if dynamic_context:
+            user_content = f"{dynamic_context}\n\n{user_content}"
+
+        self.last_prompt_tokens = self.static_prompt_tokens + builder.count(user_content)
+        print(
+            f"📏 Prompt: {self.last_prompt_tokens} tokens "
+            f"(recuerdos {included}/{len(memories or [])}, presupuesto {builder.budget})"
+        )
+        return [
+            {"role": "system", "content": self.static_prompt},
+            {"role": "user", "content": user_content}
+        ]
+
+    def _record_usage(self, usage):
+        """Registra los tokens de prompt servidos desde la caché de contexto en esta llamada."""
+        if usage is None:
+            return
+        hit = getattr(usage, "prompt_cache_hit_tokens", None)
+        miss = getattr(usage, "prompt_cache_miss_tokens", None)
+        if hit is None:
+            # Formato OpenAI: usage.prompt_tokens_details.cached_tokens
+            details = getattr(usage, "prompt_tokens_details", None)
+            hit = getattr(details, "cached_tokens", 0) or 0
+            miss = (usage.prompt_tokens or 0) - hit
+        self.last_usage = {
+            "prompt_tokens": usage.prompt_tokens or 0,
+            "cache_hit_tokens": hit or 0,
+            "cache_miss_tokens": miss or 0,
+        }
+        for key, value in self.last_usage.items():
+            self.usage_totals[key] += value
+        print(
+            f"💰 Caché de contexto: hit={self.last_usage['cache_hit_tokens']} "
+            f"miss={self.last_usage['cache_miss_tokens']} (prompt={self.last_usage['prompt_tokens']})"
         )
+
+    def _parse_response(self, response) -> dict:
+        self._record_usage(getattr(response, "usage", None))
+        # En DeepSeek-Reasoner, el pensamiento interno viene en 'reasoning_content' (si se pide)
+        # o se procesa internamente. El contenido final está en content.
+        final_content = response.choices[0].message.content
+        
+        # Opcional: Imprimir el proceso de pensamiento si el modelo lo devuelve (feature específica de R1)
+        if hasattr(response.choices[0].message, 'reasoning_content') and response.choices[0].message.reasoning_content:
+            print(f"\n🧠 [DeepSeek Thinking]:\n{response.choices[0].message.reasoning_content}\n")
+
+        return self._clean_json_response(final_content)
+
+    def generate_bizarro_thought(self, target_tweet: str, mood_context: str, memories: list) -> dict:
+        """
+        Genera una respuesta invertida usando razonamiento profundo.
+        Versión síncrona (scripts de prueba); el bucle principal usa generate_bizarro_thought_async.
+        """
+        messages = self._build_messages(target_tweet, mood_context, memories)
         # 3. Llamada a la API
         try:
             response = self.client.chat.completions.create(
                 model=self.model_reasoning,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Tweet entrante del Host: '{target_tweet}'"}
-                ],
+                messages=messages,
                 stream=False
             )
+            return self._parse_response(response)
 
-            # En DeepSeek-Reasoner, el pensamiento interno viene en 'reasoning_content' (si se pide)
-            # o se procesa internamente. El contenido final está en content.
-            final_content = response.choices[0].message.content
-            
-            # Opcional: Imprimir el proceso de pensamiento si el modelo lo devuelve (feature específica de R1)
-            if hasattr(response.choices[0].message, 'reasoning_content') and response.choices[0].message.reasoning_content:
-                print(f"\n🧠 [DeepSeek Thinking]:\n{response.choices[0].message.reasoning_content}\n")
+        except Exception as e:
+            print(f"❌ Error en DeepSeek API: {e}")
+            return None
 
-            return self._clean_json_response(final_content)
+    async def generate_bizarro_thought_async(
+        self,
+        target_tweet: str,
+        mood_context: str,
+        memories: list,
+        timeout: float | None = None,
+        stream: bool | None = None,
+        action_type: str | None = None,
+        candidates: int | None = None,
+        hedge_delay: float | None = None,
+    ) -> dict | None:
+        """
+        Variante asíncrona con plazo por llamada y concurrencia acotada.
+        - El modelo se elige según `action_type` (LLM_ROUTES). Si el razonador supera
+          LLM_REASONER_BUDGET se cancela y se reintenta con el modelo rápido dentro del plazo total.
+        - Espera turno en el semáforo (LLM_MAX_CONCURRENCY) antes de llamar a la API.
+        - Corta la llamada si supera `timeout` (LLM_TIMEOUT por defecto) y devuelve None.
+        - La cancelación externa (CancelledError) se propaga y aborta la petición HTTP.
+        - Con streaming (LLM_STREAMING) parsea el JSON según llega y aborta en cuanto
+          la salida no es JSON o el tweet supera los 280 caracteres.
+        - Con `candidates` > 1 (LLM_HEDGE_CANDIDATES) lanza varias generaciones, escalonadas
+          `hedge_delay` segundos, devuelve la primera válida y cancela el resto. Los
+          candidatos se limitan a LLM_MAX_CONCURRENCY y todo el hedge respeta `timeout`.
+        """
+        messages = self._build_messages(target_tweet, mood_context, memories)
+        deadline = timeout or LLM_TIMEOUT
+        use_stream = LLM_STREAMING if stream is None else stream
+        candidates = LLM_HEDGE_CANDIDATES if candidates is None else candidates
+        hedge_delay = LLM_HEDGE_DELAY if hedge_delay is None else hedge_delay
+
+        if candidates <= 1:
+            return await self._generate_routed(messages, deadline, use_stream, action_type)
+        return await self._generate_hedged(messages, deadline, use_stream, action_type, candidates, hedge_delay)
+
+    async def _generate_hedged(self, messages: list, deadline: float, stream: bool,
+                               action_type: str | None, candidates: int, hedge_delay: float) -> dict | None:
+        """
+        Primera decisión válida entre varios candidatos. Un candidato extra se lanza
+        al vencer `hedge_delay` o en cuanto otro termina con una salida inválida.
+        Los candidatos comparten el semáforo global con los demás workers (ACTION_WORKERS):
+        más candidatos que turnos solo harían cola, así que se limitan a LLM_MAX_CONCURRENCY,
+        y el conjunto tiene un plazo único (`deadline`), esperas de turno incluidas.
+        """
+        candidates = min(candidates, self.max_concurrency)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        pending = set()
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            remaining = deadline - (loop.time() - started)
+            if launched >= candidates or remaining <= 0:
+                return
+            launched += 1
+            pending.add(asyncio.create_task(
+                self._generate_routed(messages, remaining, stream, action_type)
+            ))
 
+        launch()
+        try:
+            async with asyncio.timeout(deadline):
+                while pending:
+                    while hedge_delay <= 0 and launched < candidates:
+                        launch()
+                    wait = hedge_delay if launched < candidates else None
+                    done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        decision = task.result()
+                        if is_valid_decision(decision):
+                            print(f"🏁 Candidato válido en {loop.time() - started:.1f}s ({launched}/{candidates} lanzados).")
+                            return decision
+                        print("🗑️ Candidato descartado (JSON inválido o tweet fuera de límite).")
+                    launch()
+            print(f"❌ Ningún candidato válido ({launched} generados).")
+            return None
+        except TimeoutError:
+            print(f"⏱️ Ningún candidato válido en el plazo de {deadline:.0f}s ({launched} lanzados).")
+            return None
+        finally:
+            # Cancela los candidatos restantes (y sus conexiones HTTP)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _generate_routed(self, messages: list, deadline: float, stream: bool,
+                               action_type: str | None) -> dict | None:
+        """Una generación completa: modelo de la ruta y, si la salida no cumple el esquema, reparación."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        decision = await self._generate_with_fallback(messages, deadline, stream, action_type)
+        if LLM_REPAIR and isinstance(decision, dict) and decision.get("raw"):
+            remaining = deadline - (loop.time() - started)
+            if remaining > 0:
+                return await self._repair_decision(decision, min(LLM_REPAIR_TIMEOUT, remaining))
+        return decision
+
+    async def _repair_decision(self, broken: dict, timeout: float) -> dict:
+        """Una llamada barata al modelo rápido para corregir JSON roto o fuera de esquema."""
+        messages = [{
+            "role": "user",
+            "content": REPAIR_PROMPT.format(error=broken["error"], raw=broken["raw"][:4000]),
+        }]
+        print(f"🩹 Reparando salida ({broken['error'][:80]}) con {self.model_chat}...")
+        try:
+            # Plazo único para la espera del semáforo y la llamada
+            async with asyncio.timeout(timeout):
+                async with self.semaphore:
+                    response = await self.async_client.chat.completions.create(
+                        model=self.model_chat,
+                        messages=messages,
+                        stream=False,
+                        temperature=0,
+                        max_tokens=REPAIR_MAX_TOKENS,
+                        response_format={"type": "json_object"},
+                    )
+        except TimeoutError:
+            print(f"⏱️ Reparación superó {timeout:.0f}s.")
+            return broken
+        except Exception as e:
+            print(f"❌ Error reparando salida: {e}")
+            return broken
+        repaired = self._clean_json_response(response.choices[0].message.content)
+        if "error" in repaired:
+            return broken
+        print("✅ Salida reparada sin regenerar.")
+        return repaired
+
+    async def _generate_with_fallback(self, messages: list, deadline: float, stream: bool,
+                                      action_type: str | None) -> dict | None:
+        """Una generación con el modelo de la ruta y caída al modelo rápido si el razonador se excede."""
+        model = self.router.choose(action_type)
+
+        if not self.router.is_reasoner(model) or self.router.reasoner_budget >= deadline:
+            return await self._call_model(model, messages, deadline, stream)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            return await self._call_model(
+                model, messages, self.router.reasoner_budget, stream, raise_timeout=True
+            )
+        except asyncio.TimeoutError:
+            remaining = deadline - (loop.time() - started)
+            print(f"🔀 {model} excedió {self.router.reasoner_budget:.0f}s; usando {self.model_chat} ({remaining:.0f}s restantes).")
+            if remaining <= 0:
+                return None
+            return await self._call_model(self.model_chat, messages, remaining, stream)
+
+    async def _call_model(self, model: str, messages: list, timeout: float, stream: bool,
+                          raise_timeout: bool = False) -> dict | None:
+        """
+        Una llamada con semáforo, plazo y registro de latencia por modelo.
+        El plazo incluye la espera del semáforo: una llamada en cola tras otros
+        workers no puede pasarse de `timeout`.
+        """
+        loop = asyncio.get_running_loop()
+        acquired = None
+        try:
+            async with asyncio.timeout(timeout):
+                async with self.semaphore:
+                    acquired = loop.time()
+                    if stream:
+                        result = await self._request_streaming(messages, model)
+                    else:
+                        result = await self._request(messages, model)
+            self.router.record(model, loop.time() - acquired)
+            return result
+        except TimeoutError:
+            # Solo cuenta como timeout del modelo si llegó a ejecutarse
+            if acquired is not None:
+                self.router.record(model, loop.time() - acquired, timed_out=True)
+            if raise_timeout:
+                raise
+            print(f"⏱️ {model} superó el plazo de {timeout:.0f}s (incluida la espera de turno). Llamada cancelada.")
+            return None
         except Exception as e:
             print(f"❌ Error en DeepSeek API: {e}")
             return None
+        finally:
+            stats = self.router.stats().get(model)
+            if stats:
+                print(f"📊 Latencia {model}: p50={stats['p50']}s p95={stats['p95']}s (n={stats['count']}, timeouts={stats['timeouts']})")
+
+    async def _request(self, messages: list, model: str) -> dict:
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=False
+        )
+        return self._parse_response(response)
+
+    async def _request_streaming(self, messages: list, model: str) -> dict | None:
+        """Consume la respuesta en streaming y corta la conexión si la salida ya no sirve."""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        parser = DecisionStreamParser(max_tweet_chars=MAX_TWEET_CHARS)
+        stream = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True,
+            # El último chunk trae usage (incluye los tokens servidos desde caché)
+            stream_options={"include_usage": True}
+        )
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    self._record_usage(chunk.usage)
+                if not chunk.choices or parser.complete:
+                    continue
+                content = getattr(chunk.choices[0].delta, "content", None)
+                if not content:
+                    # deepseek-reasoner emite primero reasoning_content; no afecta al JSON
+                    continue
+                had_tweet = parser.tweet_content is not None
+                parser.feed(content)
+                if parser.tweet_content is not None and not had_tweet:
+                    print(f"⚡ tweet_content listo a los {loop.time() - started:.1f}s: {parser.tweet_content[:60]}...")
+                if parser.error == "not_json":
+                    # Sin objeto a la vista: el parser tolerante (y la reparación) deciden con lo recibido
+                    print(f"✂️ Streaming abortado (not_json) tras {len(parser.text)} caracteres.")
+                    return self._clean_json_response(parser.text)
+                if parser.error:
+                    print(f"✂️ Streaming abortado ({parser.error}) tras {len(parser.text)} caracteres.")
+                    return None
+                # Con el objeto completo se sigue leyendo solo hasta el chunk de usage;
+                # lo que llegue tras la '}' queda fuera de parser.object_text
+        finally:
+            # Cierra la conexión HTTP también al abortar o al cancelarse la tarea
+            await stream.close()
+
+        # Solo el objeto: el texto cortado tras la '}' (fence a medias, prosa) no es JSON
+        return self._clean_json_response(parser.object_text)
 
 # Instancia global
 brain = CognitiveEngine()
@@ -0,0 +1,73 @@
+import os
+from typing import List, Sequence, Tuple
+
+# Presupuesto total de tokens del prompt (system + contexto dinámico + tweet)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 4000))
+# Tokens máximos por recuerdo individual (los más largos se truncan)
+MEMORY_MAX_TOKENS = int(os.getenv("MEMORY_MAX_TOKENS", 200))
+# cl100k_base es una aproximación razonable del tokenizador de DeepSeek
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+
+NO_MEMORIES_TEXT = "Sin recuerdos previos relevantes."
+TRUNCATION_MARK = "…"
+
+
+class ContextBuilder:
+    """
+    Arma el bloque de recuerdos (RAG) respetando un presupuesto de tokens.
+    - Cuenta tokens con tiktoken (o una estimación si el encoding no está disponible).
+    - Ordena los recuerdos por relevancia (distancia ascendente si existe).
+    - Trunca cada recuerdo a MEMORY_MAX_TOKENS y añade hasta agotar el presupuesto.
+    """
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET, per_memory: int = MEMORY_MAX_TOKENS):
+        self.budget = budget
+        self.per_memory = per_memory
+        self._encoding = None
+        self._encoding_loaded = False
+
+    @property
+    def encoding(self):
+        if not self._encoding_loaded:
+            self._encoding_loaded = True
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                print(f"⚠️ tiktoken no disponible ({e}); se estimarán los tokens.")
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return len(text) // 4 + 1
+        return len(self.encoding.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Recorta un texto a `max_tokens` tokens, marcando el corte."""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.encoding is None:
+            return text[: max_tokens * 4].rstrip() + TRUNCATION_MARK
+        return self.encoding.decode(self.encoding.encode(text)[:max_tokens]).rstrip() + TRUNCATION_MARK
+
+    def build_rag_text(self, memories: Sequence, reserved_tokens: int) -> Tuple[str, int]:
+        """
+        Devuelve (rag_text, recuerdos_incluidos) sin superar `budget - reserved_tokens`.
+        `reserved_tokens` es lo que ya ocupan el system prompt, el mood y el tweet.
+        """
+        available = self.budget - reserved_tokens
+        ranked = sorted(memories or [], key=lambda m: getattr(m, "distance", 0.0) or 0.0)
+        lines: List[str] = []
+        used = 0
+        for memory in ranked:
+            line = f"- {self.truncate(memory.content, self.per_memory)}"
+            cost = self.count(line) + 1  # salto de línea
+            if used + cost > available:
+                continue  # puede caber otro recuerdo menos relevante pero más corto
+            lines.append(line)
+            used += cost
+        if not lines:
+            return NO_MEMORIES_TEXT, 0
+        return "\n".join(lines), len(lines)
@@ -0,0 +1,109 @@
+import re
+import ast
+import json
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+MAX_TWEET_CHARS = 280
+
+FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL | re.IGNORECASE)
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+
+class BizarroDecision(BaseModel):
+    """Esquema de la respuesta del cerebro (lo que el system prompt pide a DeepSeek)."""
+
+    model_config = ConfigDict(extra="ignore", str_strip_whitespace=True)
+
+    tweet_content: str = Field(min_length=1, max_length=MAX_TWEET_CHARS)
+    thought_process: str = ""
+    new_valence_delta: float = 0.0
+    new_arousal_delta: float = 0.0
+
+
+def _scan_object(text: str, start: int):
+    """
+    Recorre el objeto que empieza en `start` respetando strings y escapes.
+    Devuelve (fin, llaves_pendientes, dentro_de_string, comas_de_primer_nivel);
+    fin es None si el objeto está truncado.
+    """
+    stack = []
+    in_string = False
+    escape = False
+    commas = []
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return i, stack, False, commas
+        elif ch == "," and len(stack) == 1:
+            commas.append(i)
+    return None, stack, in_string, commas
+
+
+def _loads(candidate: str):
+    """json.loads tolerante: comas colgantes y comillas simples (estilo dict de Python)."""
+    for attempt in (candidate, TRAILING_COMMA_PATTERN.sub(r"\1", candidate)):
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            pass
+    try:
+        return ast.literal_eval(candidate)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def extract_json_object(content: str) -> dict | None:
+    """
+    Extrae el primer objeto JSON de la salida del LLM reparando roturas comunes:
+    bloques ```json, texto antes/después del objeto, comillas simples, comas
+    colgantes y objetos truncados (se descartan los campos incompletos).
+    """
+    if not content:
+        return None
+    fenced = FENCE_PATTERN.search(content)
+    text = fenced.group(1) if fenced and "{" in fenced.group(1) else content
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    end, stack, in_string, commas = _scan_object(text, start)
+    if end is not None:
+        candidates = [text[start:end + 1]]
+    else:
+        # Truncado: cerrar las llaves pendientes o descartar el último campo incompleto.
+        # Un string cortado nunca se cierra: sería un tweet mutilado.
+        candidates = [] if in_string else [text[start:] + "".join(reversed(stack))]
+        candidates += [text[start:comma] + "}" for comma in reversed(commas)]
+
+    for candidate in candidates:
+        parsed = _loads(candidate)
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+def parse_decision(content: str) -> tuple[BizarroDecision | None, str | None]:
+    """Devuelve (decisión, None) o (None, descripción del error) para la salida cruda del LLM."""
+    data = extract_json_object(content)
+    if data is None:
+        return None, "JSON_PARSE_FAILED"
+    try:
+        return BizarroDecision.model_validate(data), None
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+        return None, f"SCHEMA_INVALID: {problems}"
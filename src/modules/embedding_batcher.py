@@ -0,0 +1,100 @@
+import asyncio
+from typing import Awaitable, Callable, Iterator, List, Sequence, Tuple
+
+EmbedFn = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata (~4 caracteres por token) suficiente para respetar límites de lote."""
+    return len(text) // 4 + 1
+
+
+def iter_batches(texts: Sequence[str], max_size: int, max_tokens: int) -> Iterator[Tuple[int, List[str]]]:
+    """
+    Parte una lista de textos en lotes que respetan tamaño máximo y presupuesto de tokens.
+    Devuelve (offset, lote) para poder reensamblar el orden original.
+    """
+    batch: List[str] = []
+    tokens = 0
+    offset = 0
+    for i, text in enumerate(texts):
+        cost = estimate_tokens(text)
+        if batch and (len(batch) >= max_size or tokens + cost > max_tokens):
+            yield offset, batch
+            batch, tokens, offset = [], 0, i
+        batch.append(text)
+        tokens += cost
+    if batch:
+        yield offset, batch
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batcher asíncrono: agrupa las peticiones concurrentes que llegan dentro de
+    una ventana corta en una sola llamada a `embed_fn`.
+    El lote se despacha antes si alcanza `max_batch_size` o `max_batch_tokens`.
+    """
+
+    def __init__(
+        self,
+        embed_fn: EmbedFn,
+        window: float = 0.02,
+        max_batch_size: int = 64,
+        max_batch_tokens: int = 50000,
+    ):
+        self._embed_fn = embed_fn
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._pending_tokens = 0
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._inflight: set[asyncio.Task] = set()
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        cost = estimate_tokens(text)
+
+        # Si este texto desborda el presupuesto del lote actual, despachamos primero
+        if self._pending and self._pending_tokens + cost > self.max_batch_tokens:
+            self._flush()
+
+        self._pending.append((text, future))
+        self._pending_tokens += cost
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending, self._pending_tokens = self._pending, [], 0
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._dispatch(batch))
+        # Mantener referencia fuerte hasta que termine
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]):
+        # Textos repetidos dentro de la ventana se envían una sola vez
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        try:
+            vectors = await self._embed_fn(unique)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(unique, vectors))
+        for text, future in batch:
+            # El llamador pudo haber cancelado mientras esperaba
+            if not future.done():
+                future.set_result(by_text[text])
@@ -0,0 +1,121 @@
+import os
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from src.core.database import get_async_db_session
+from src.core.models import EmbeddingCacheEntry
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 2048))
+EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "1") == "1"
+
+
+def normalize_text(text: str) -> str:
+    """Normalización usada para la clave: espacios colapsados y sin saltos de línea."""
+    return " ".join(text.split())
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Caché direccionada por contenido (hash del texto normalizado + modelo).
+    - Nivel 1: LRU en memoria.
+    - Nivel 2: tabla embedding_cache en Postgres (sobrevive reinicios).
+    Los contadores permiten medir cuántas llamadas a la API se ahorran.
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, persist: bool = EMBEDDING_CACHE_PERSIST):
+        self.max_entries = max_entries
+        self.persist = persist
+        self._lru: "OrderedDict[tuple[str, str], List[float]]" = OrderedDict()
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "api_calls_saved": self.memory_hits + self.persistent_hits,
+            "memory_entries": len(self._lru),
+        }
+
+    def get_memory(self, text: str, model: str) -> List[float] | None:
+        """Consulta solo el nivel en memoria (sin I/O)."""
+        key = (text_hash(text), model)
+        vector = self._lru.get(key)
+        if vector is not None:
+            self._lru.move_to_end(key)
+            self.memory_hits += 1
+        return vector
+
+    async def get_many(self, texts: Iterable[str], model: str) -> Dict[str, List[float]]:
+        """
+        Resuelve una lista de textos contra ambos niveles.
+        Devuelve {texto: vector} solo para los aciertos; cuenta los fallos.
+        """
+        found: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for text in dict.fromkeys(texts):
+            h = text_hash(text)
+            vector = self._lru.get((h, model))
+            if vector is not None:
+                self._lru.move_to_end((h, model))
+                self.memory_hits += 1
+                found[text] = vector
+            else:
+                missing[h] = text
+
+        if missing and self.persist:
+            for h, vector in (await self._load_persistent(list(missing), model)).items():
+                self._remember((h, model), vector)
+                self.persistent_hits += 1
+                found[missing.pop(h)] = vector
+
+        self.misses += len(missing)
+        return found
+
+    async def put_many(self, items: Dict[str, List[float]], model: str):
+        """Guarda vectores recién generados en memoria y (opcionalmente) en Postgres."""
+        rows = []
+        for text, vector in items.items():
+            h = text_hash(text)
+            self._remember((h, model), vector)
+            rows.append({"text_hash": h, "model": model, "embedding": vector})
+        if rows and self.persist:
+            await self._store_persistent(rows)
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def _load_persistent(self, hashes: List[str], model: str) -> Dict[str, List[float]]:
+        try:
+            async with get_async_db_session() as session:
+                rows = await session.execute(
+                    select(EmbeddingCacheEntry.text_hash, EmbeddingCacheEntry.embedding)
+                    .where(tuple_(EmbeddingCacheEntry.text_hash, EmbeddingCacheEntry.model).in_(
+                        [(h, model) for h in hashes]
+                    ))
+                )
+                return {h: list(vector) for h, vector in rows}
+        except Exception as e:
+            print(f"⚠️ Error leyendo caché de embeddings: {e}")
+            return {}
+
+    async def _store_persistent(self, rows: List[dict]):
+        try:
+            async with get_async_db_session() as session:
+                await session.execute(
+                    insert(EmbeddingCacheEntry).values(rows).on_conflict_do_nothing()
+                )
+                await session.commit()
+        except Exception as e:
+            print(f"⚠️ Error guardando caché de embeddings: {e}")
@@ -0,0 +1,87 @@
+import os
+from typing import Any, Iterable, List
+from src.core.state_store import get_state, set_state, contiguous_watermark
+from src.modules.x_client import x_bot
+
+TARGET_HOST = os.getenv("X_USERNAME")
+HOST_WATERMARK_KEY = "host_timeline_watermark"
+# Páginas máximas por ciclo (tope de seguridad si el host publica en ráfaga)
+HOST_FEED_MAX_PAGES = int(os.getenv("HOST_FEED_MAX_PAGES", 5))
+HOST_FEED_PAGE_SIZE = 20
+
+
+def _numeric_id(tweet: Any) -> int:
+    return int(getattr(tweet, "id", None) or tweet["id"])
+
+
+class HostTimelineFeed:
+    """
+    Ingesta incremental del timeline del host.
+    - Watermark persistido (agent_state): id del último tweet ya atendido o descartado;
+      todos los anteriores también lo están.
+    - Cada ciclo pide solo `since_id:<watermark>` y pagina con el cursor de twikit
+      hasta agotar los tweets nuevos (máx. HOST_FEED_MAX_PAGES).
+    - El watermark solo avanza por el prefijo contiguo de tweets atendidos, así un
+      tweet que no cupo en el presupuesto del ciclo se vuelve a ofrecer.
+    """
+
+    def __init__(self, x_client=x_bot, username: str | None = TARGET_HOST):
+        self.x_client = x_client
+        self.username = username
+        self.watermark: int | None = None
+        self._loaded = False
+
+    async def _load(self):
+        if self._loaded:
+            return
+        value = await get_state(HOST_WATERMARK_KEY)
+        self.watermark = int(value) if value else None
+        self._loaded = True
+
+    async def fetch_new(self) -> List[Any]:
+        """Tweets del host posteriores al watermark, del más antiguo al más nuevo."""
+        await self._load()
+        bootstrap = self.watermark is None
+        query = f"from:{self.username}"
+        if not bootstrap:
+            query += f" since_id:{self.watermark}"
+        print(f"👁️ Escaneando perfil de @{self.username} (watermark={self.watermark})...")
+
+        page = await self.x_client.client.search_tweet(query, product="Latest", count=HOST_FEED_PAGE_SIZE)
+        floor = self.watermark or 0
+        found = {}
+        pages = 1
+        while page:
+            fresh = [t for t in page if _numeric_id(t) > floor]
+            found.update((_numeric_id(t), t) for t in fresh)
+            # Página con tweets ya vistos (o primer arranque): no hace falta seguir
+            if bootstrap or len(fresh) < len(page) or not getattr(page, "next_cursor", None):
+                break
+            if pages >= HOST_FEED_MAX_PAGES:
+                print(f"⚠️ Límite de {HOST_FEED_MAX_PAGES} páginas del host alcanzado; los tweets más antiguos se omiten.")
+                break
+            page = await page.next()
+            pages += 1
+
+        tweets = [found[key] for key in sorted(found)]
+        if bootstrap and tweets:
+            # Primer arranque: solo el último tweet (como antes); lo anterior se da por visto
+            tweets = tweets[-1:]
+            self.watermark = _numeric_id(tweets[0]) - 1
+        print(f"📥 Tweets nuevos del host: {len(tweets)} ({pages} páginas)")
+        return tweets
+
+    async def advance(self, tweets: Iterable[Any], pending_ids: Iterable[str]):
+        """
+        Avanza el watermark hasta el último tweet tal que él y todos los anteriores
+        ya no están pendientes (atendidos o descartados por la máquina de estados).
+        """
+        marks = [(_numeric_id(t), str(_numeric_id(t))) for t in sorted(tweets, key=_numeric_id)]
+        new_mark = contiguous_watermark(marks, pending_ids, self.watermark)
+        if new_mark is not None and new_mark != self.watermark:
+            if await set_state(HOST_WATERMARK_KEY, str(new_mark)):
+                self.watermark = new_mark
+
+
+# Instancia global
+host_feed = HostTimelineFeed()
@@ -0,0 +1,82 @@
+import os
+from typing import Iterable, Set
+from sqlalchemy import select
+from src.core.database import get_async_db_session
+from src.core.models import InteractionLog
+
+# Cuántos IDs recientes se precargan al arrancar (0 = todos)
+HANDLED_INDEX_WARM_LIMIT = int(os.getenv("HANDLED_INDEX_WARM_LIMIT", 50000))
+
+
+class HandledTweetIndex:
+    """
+    Índice en memoria de tweet_ids a los que ya reaccionamos.
+    - Se precarga al arrancar (warm()); si falla, el ciclo la reintenta mientras `warmed` sea False.
+    - Se actualiza en cada inserción (mark_handled()).
+    - Los IDs desconocidos se resuelven en lote con un único `IN (...)` sobre
+      interaction_logs.tweet_id (indexado), así cubrimos escrituras de otros procesos.
+    """
+
+    def __init__(self):
+        self._handled: Set[str] = set()
+        self.warmed = False
+
+    def __contains__(self, tweet_id: str) -> bool:
+        return tweet_id in self._handled
+
+    def __len__(self) -> int:
+        return len(self._handled)
+
+    async def warm(self, limit: int = HANDLED_INDEX_WARM_LIMIT):
+        """Carga los tweet_ids más recientes de interaction_logs."""
+        query = (
+            select(InteractionLog.tweet_id)
+            .where(InteractionLog.tweet_id.is_not(None))
+            .order_by(InteractionLog.id.desc())
+        )
+        if limit:
+            query = query.limit(limit)
+        try:
+            async with get_async_db_session() as session:
+                ids = (await session.scalars(query)).all()
+            self._handled.update(ids)
+            self.warmed = True
+            print(f"🗂️ Índice de interacciones precargado: {len(self._handled)} IDs")
+        except Exception as e:
+            print(f"⚠️ No se pudo precargar el índice de interacciones: {e}")
+
+    def mark_handled(self, tweet_id: str | None):
+        """Registra un ID recién insertado en interaction_logs."""
+        if tweet_id:
+            self._handled.add(tweet_id)
+
+    async def handled_among(self, tweet_ids: Iterable[str | None]) -> Set[str]:
+        """
+        Devuelve el subconjunto de tweet_ids ya manejados.
+        Cero consultas si todo está en memoria; una sola si hay IDs desconocidos.
+        """
+        candidates = {tid for tid in tweet_ids if tid}
+        handled = candidates & self._handled
+        unknown = candidates - handled
+        if unknown:
+            found = await self._fetch_handled(unknown)
+            self._handled.update(found)
+            handled |= found
+        return handled
+
+    async def _fetch_handled(self, tweet_ids: Set[str]) -> Set[str]:
+        try:
+            async with get_async_db_session() as session:
+                rows = await session.scalars(
+                    select(InteractionLog.tweet_id)
+                    .where(InteractionLog.tweet_id.in_(tweet_ids))
+                    .distinct()
+                )
+                return set(rows.all())
+        except Exception as e:
+            print(f"❌ Error verificando DB: {e}")
+            return set()
+
+
+# Instancia global
+handled_index = HandledTweetIndex()
@@ -0,0 +1,124 @@
+import json
+
+# Texto tolerado antes del objeto JSON (ej. "```json\n" o "Aquí tienes la respuesta:")
+MAX_PREAMBLE_CHARS = 400
+
+
+class DecisionStreamParser:
+    """
+    Parser incremental para la respuesta JSON del cerebro mientras llega en streaming.
+    No construye el objeto completo: solo sigue la estructura (profundidad, strings,
+    escapes) para:
+    - exponer `tweet_content` en cuanto su string se cierra,
+    - marcar `error` en cuanto la salida es claramente inválida o el tweet excede el límite,
+    - saber cuándo se cierra el objeto de primer nivel (`complete`) y qué porción
+      del texto ocupa (`object_text`), sin el fence ni el texto que lo rodea.
+    """
+
+    def __init__(self, max_tweet_chars: int = 280):
+        self.max_tweet_chars = max_tweet_chars
+        self.text = ""
+        self.tweet_content: str | None = None
+        self.error: str | None = None
+        self.complete = False
+
+        self._started = False
+        self._pos = 0            # índice en `text` del carácter que se consume
+        self._start = None       # índice de la '{' inicial
+        self._end = None         # índice tras la '}' que cierra el objeto
+        self._preamble = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = None      # None | "" (tras '\') | "uXXXX" parcial
+        self._buffer = []        # string actual decodificado
+        self._buffer_len = 0
+        self._last_key = None
+        self._expect_key = False
+        self._capturing = False  # el string actual es el valor de tweet_content
+
+    def feed(self, chunk: str):
+        offset = len(self.text)
+        self.text += chunk
+        for i, ch in enumerate(chunk):
+            if self.error or self.complete:
+                return
+            self._pos = offset + i
+            self._consume(ch)
+
+    @property
+    def object_text(self) -> str:
+        """El objeto `{...}` seguido; si no empezó, todo el texto; si no cerró, desde la '{'."""
+        if self._start is None:
+            return self.text
+        return self.text[self._start:self._end]
+
+    def _consume(self, ch: str):
+        if not self._started:
+            if ch == "{":
+                self._started = True
+                self._start = self._pos
+                self._depth = 1
+                self._expect_key = True
+                return
+            self._preamble += ch
+            # Prosa o fence antes del objeto: se acepta hasta el límite; solo entonces se aborta
+            if len(self._preamble) > MAX_PREAMBLE_CHARS:
+                self.error = "not_json"
+            return
+
+        if self._in_string:
+            self._consume_string_char(ch)
+            return
+
+        if ch == '"':
+            self._in_string = True
+            self._buffer = []
+            self._buffer_len = 0
+            self._capturing = (self._depth == 1 and not self._expect_key and self._last_key == "tweet_content")
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self.complete = True
+                self._end = self._pos + 1
+        elif ch == "," and self._depth == 1:
+            self._expect_key = True
+        elif ch == ":" and self._depth == 1:
+            self._expect_key = False
+
+    def _consume_string_char(self, ch: str):
+        if self._escape is not None:
+            self._escape += ch
+            if self._escape.startswith("u"):
+                if len(self._escape) < 5:
+                    return
+                try:
+                    decoded = chr(int(self._escape[1:], 16))
+                except ValueError:
+                    decoded = ""
+            else:
+                decoded = json.loads(f'"\\{self._escape}"') if self._escape in '"\\/bfnrt' else self._escape
+            self._escape = None
+            self._append(decoded)
+            return
+
+        if ch == "\\":
+            self._escape = ""
+        elif ch == '"':
+            self._in_string = False
+            value = "".join(self._buffer)
+            if self._depth == 1 and self._expect_key:
+                self._last_key = value
+            elif self._capturing:
+                self.tweet_content = value
+                self._capturing = False
+        else:
+            self._append(ch)
+
+    def _append(self, decoded: str):
+        self._buffer.append(decoded)
+        self._buffer_len += len(decoded)
+        # Solo el valor de tweet_content tiene límite de longitud
+        if self._capturing and self._buffer_len > self.max_tweet_chars:
+            self.error = "too_long"
@@ -1,12 +1,32 @@
 import os
-from openai import OpenAI
-from sqlalchemy import select
+import asyncio
+from openai import AsyncOpenAI
+from sqlalchemy import select, cast, func
+from pgvector.sqlalchemy import BIT
 from dotenv import load_dotenv
-from src.core.database import get_db_session
-from src.core.models import SemanticMemory
+from src.core.database import get_async_db_session
+from src.core.models import SemanticMemory, MemoryHit
+from src.core.vector_index import (
+    apply_search_settings,
+    compact_embedding,
+    MEMORY_STORAGE_MODE,
+    MEMORY_COMPACT_DIMENSIONS,
+    MEMORY_RERANK_CANDIDATES,
+)
+from src.modules.embedding_batcher import EmbeddingBatcher, iter_batches
+from src.modules.embedding_cache import EmbeddingCache, normalize_text
+from src.modules.vector_replica import build_replica
 
 load_dotenv()
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 1536
+
+# Micro-batching de embeddings: ventana de espera y límites por petición
+EMBEDDING_BATCH_WINDOW_MS = int(os.getenv("EMBEDDING_BATCH_WINDOW_MS", 20))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 64))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 50000))
+
 class MemoryService:
     def __init__(self):
         api_key = os.getenv("OPENAI_API_KEY")
@@ -14,66 +34,177 @@ class MemoryService:
             raise ValueError("❌ OPENAI_API_KEY requerida para generar embeddings de memoria.")
         
         # Cliente dedicado solo para embeddings
-        self.client = OpenAI(api_key=api_key)
+        self.client = AsyncOpenAI(api_key=api_key)
+        # Caché por contenido (LRU + tabla embedding_cache)
+        self.cache = EmbeddingCache()
+        # Réplica local opcional (NumPy) para recuperar sin ir a Postgres
+        self.replica = build_replica()
+        # Agrupa llamadas concurrentes a get_embedding en una sola petición
+        self.batcher = EmbeddingBatcher(
+            self.get_embeddings,
+            window=EMBEDDING_BATCH_WINDOW_MS / 1000,
+            max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+            max_batch_tokens=EMBEDDING_BATCH_MAX_TOKENS,
+        )
+
+    async def get_embeddings(self, texts):
+        """
+        Genera vectores de 1536 dimensiones para una lista de textos.
+        Consulta primero la caché; solo los fallos van a la API, en lotes paralelos
+        que respetan los límites de tamaño/tokens. Conserva el orden de entrada.
+        """
+        texts = [normalize_text(text) for text in texts] # Normalización básica
+        vectors = await self.cache.get_many(texts, EMBEDDING_MODEL)
+        missing = [text for text in dict.fromkeys(texts) if text not in vectors]
+
+        if missing:
+            fresh = dict(zip(missing, await self._request_embeddings(missing)))
+            # Los vectores de fallo (todo ceros) no se cachean
+            await self.cache.put_many({t: v for t, v in fresh.items() if any(v)}, EMBEDDING_MODEL)
+            vectors.update(fresh)
+
+        return [vectors[text] for text in texts]
+
+    async def _request_embeddings(self, texts):
+        batches = list(iter_batches(texts, EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_MAX_TOKENS))
+        results = await asyncio.gather(*(self._embed_batch(batch) for _, batch in batches))
 
-    def get_embedding(self, text):
-        """Genera vector de 1536 dimensiones usando OpenAI."""
+        vectors = [None] * len(texts)
+        for (offset, _), batch_vectors in zip(batches, results):
+            vectors[offset:offset + len(batch_vectors)] = batch_vectors
+        return vectors
+
+    async def _embed_batch(self, batch):
         try:
-            text = text.replace("\n", " ") # Normalización básica
-            response = self.client.embeddings.create(
-                input=[text],
-                model="text-embedding-3-small"
+            response = await self.client.embeddings.create(
+                input=batch,
+                model=EMBEDDING_MODEL
             )
-            return response.data[0].embedding
+            # La API devuelve los items con su índice; no asumir orden
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
         except Exception as e:
-            print(f"⚠️ Error generando embedding: {e}")
-            # Retornar vector vacío en caso de fallo crítico para no detener el bot
-            return [0.0] * 1536
+            print(f"⚠️ Error generando embeddings ({len(batch)} textos): {e}")
+            # Retornar vectores vacíos en caso de fallo crítico para no detener el bot
+            return [[0.0] * EMBEDDING_DIMENSIONS for _ in batch]
 
-    def retrieve_context(self, query_text, limit=3):
-        """Busca recuerdos semánticamente similares en Postgres."""
-        query_vector = self.get_embedding(query_text)
-        
-        session_gen = get_db_session()
-        session = next(session_gen)
-        
-        try:
-            # Búsqueda por similitud de coseno (operador <=>)
-            results = session.scalars(
-                select(SemanticMemory)
-                .order_by(SemanticMemory.embedding.cosine_distance(query_vector))
-                .limit(limit)
-            ).all()
-            
-            return results
-        except Exception as e:
-            print(f"❌ Error recuperando memoria: {e}")
-            return []
-        finally:
-            session.close()
-
-    def save_memory(self, content, source_type, metadata=None):
-        """Guarda un nuevo recuerdo (ej. tweet propio o del host)."""
-        vector = self.get_embedding(content)
-        
-        session_gen = get_db_session()
-        session = next(session_gen)
-        
-        try:
-            mem = SemanticMemory(
-                content=content,
-                embedding=vector,
-                source_type=source_type,
-                metadata_=metadata or {}
+    async def get_embedding(self, text):
+        """Genera el vector de un texto, coalesciendo con otras llamadas concurrentes."""
+        cached = self.cache.get_memory(normalize_text(text), EMBEDDING_MODEL)
+        if cached is not None:
+            return cached
+        return await self.batcher.embed(text)
+
+    @staticmethod
+    def _memory_filters(source_types=None, metadata=None, since=None):
+        """Predicados SQL para acotar la búsqueda (usan los índices B-tree/GIN de SemanticMemory)."""
+        filters = []
+        if source_types:
+            filters.append(SemanticMemory.source_type.in_(list(source_types)))
+        if metadata:
+            # Contención JSONB (@>), servida por el índice GIN jsonb_path_ops
+            filters.append(SemanticMemory.metadata_.contains(metadata))
+        if since is not None:
+            filters.append(SemanticMemory.created_at >= since)
+        return filters
+
+    def _memory_query(self, query_vector, limit, filters=(), min_similarity=None):
+        """
+        Consulta de similitud en dos niveles:
+        1. Candidatos por el índice ANN, con los filtros aplicados en el mismo recorrido
+           (modo 'full': distancia coseno exacta; modos compactos: copia reducida y
+           MEMORY_RERANK_CANDIDATES candidatos).
+        2. Orden final por distancia coseno exacta sobre `embedding` y umbral de similitud.
+        """
+        exact_distance = SemanticMemory.embedding.cosine_distance(query_vector)
+        if MEMORY_STORAGE_MODE == "full":
+            first_pass = exact_distance
+            pool = limit
+        else:
+            compact_query = compact_embedding(query_vector)
+            if MEMORY_STORAGE_MODE == "halfvec":
+                first_pass = SemanticMemory.embedding_compact.cosine_distance(compact_query)
+            else:
+                # Misma expresión que el índice: binary_quantize(embedding_compact)::bit(N)
+                query_bits = "".join("1" if x > 0 else "0" for x in compact_query)
+                first_pass = cast(
+                    func.binary_quantize(SemanticMemory.embedding_compact), BIT(MEMORY_COMPACT_DIMENSIONS)
+                ).hamming_distance(query_bits)
+            pool = max(limit, MEMORY_RERANK_CANDIDATES)
+
+        candidates = (
+            select(SemanticMemory.id)
+            .where(*filters)
+            .order_by(first_pass)
+            .limit(pool)
+            .scalar_subquery()
+        )
+        # Proyección de columnas: el vector nunca viaja de vuelta a Python
+        distance = exact_distance.label("distance")
+        query = (
+            select(SemanticMemory.id, SemanticMemory.content, SemanticMemory.source_type, distance)
+            .where(SemanticMemory.id.in_(candidates))
+        )
+        if min_similarity is not None:
+            # similitud coseno = 1 - distancia
+            query = query.where(exact_distance <= 1 - min_similarity)
+        return query.order_by(distance).limit(limit)
+
+    async def retrieve_context(self, query_text, limit=3, source_types=None, metadata=None,
+                               since=None, min_similarity=None):
+        """
+        Busca recuerdos semánticamente similares en Postgres y devuelve MemoryHit
+        (id, content, source_type, distance). Filtros opcionales: tipos de origen, predicado de contención sobre metadata (dict),
+        ventana temporal (`since`, datetime) y similitud coseno mínima.
+        """
+        query_vector = await self.get_embedding(query_text)
+
+        # Réplica local al día: respuesta en memoria sin ida y vuelta a Postgres
+        # (los predicados sobre metadata solo se resuelven en SQL)
+        if self.replica and self.replica.is_fresh() and not metadata:
+            return self.replica.search(
+                query_vector, limit,
+                source_types=source_types, since=since, min_similarity=min_similarity,
             )
-            session.add(mem)
-            session.commit()
-            print(f"💾 Memoria guardada: '{content[:30]}...'")
-        except Exception as e:
-            print(f"❌ Error guardando memoria: {e}")
-            session.rollback()
-        finally:
-            session.close()
+
+        filters = self._memory_filters(source_types, metadata, since)
+        async with get_async_db_session() as session:
+            try:
+                # ef_search/probes (y escaneo iterativo si hay filtros) para esta transacción
+                await apply_search_settings(session, filtered=bool(filters))
+                rows = await session.execute(
+                    self._memory_query(query_vector, limit, filters, min_similarity)
+                )
+                return [MemoryHit(*row) for row in rows]
+            except Exception as e:
+                print(f"❌ Error recuperando memoria: {e}")
+                return []
+
+    async def save_memory(self, content, source_type, metadata=None) -> bool:
+        """Guarda un nuevo recuerdo (ej. tweet propio o del host). Devuelve False si falló."""
+        vector = await self.get_embedding(content)
+        if not any(vector):
+            # Vector de fallo (API caída): no guardar un recuerdo inservible
+            print(f"⚠️ Embedding no disponible; recuerdo no guardado: '{content[:30]}...'")
+            return False
+        
+        async with get_async_db_session() as session:
+            try:
+                mem = SemanticMemory(
+                    content=content,
+                    embedding=vector,
+                    source_type=source_type,
+                    metadata_=metadata or {}
+                )
+                if MEMORY_STORAGE_MODE != "full":
+                    mem.embedding_compact = compact_embedding(vector)
+                session.add(mem)
+                await session.commit()
+                print(f"💾 Memoria guardada: '{content[:30]}...'")
+                return True
+            except Exception as e:
+                print(f"❌ Error guardando memoria: {e}")
+                await session.rollback()
+                return False
 
 # Instancia global
 memory_service = MemoryService()
\ No newline at end of file
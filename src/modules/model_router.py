@@ -0,0 +1,78 @@
+import os
+from collections import deque
+from typing import Dict
+
+LLM_MODEL_REASONER = os.getenv("LLM_MODEL_REASONER", "deepseek-reasoner")  # R1 (Chain of Thought)
+LLM_MODEL_FAST = os.getenv("LLM_MODEL_FAST", "deepseek-chat")              # V3 (rápido)
+# Modelo por tipo de ActionPlan: 'reasoner' o 'fast'
+LLM_ROUTES = os.getenv("LLM_ROUTES", "host=reasoner,mention=fast,daily=fast")
+# Si el razonador no responde en este plazo (segundos) se cae al modelo rápido
+LLM_REASONER_BUDGET = float(os.getenv("LLM_REASONER_BUDGET", 60))
+# Muestras de latencia conservadas por modelo
+LATENCY_WINDOW = 100
+
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """'host=reasoner,mention=fast' -> {'host': 'reasoner', 'mention': 'fast'}"""
+    routes = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        action, tier = (p.strip().lower() for p in part.split("=", 1))
+        if tier not in ("reasoner", "fast"):
+            raise ValueError(f"❌ LLM_ROUTES inválido: '{part}' (usa 'reasoner' o 'fast')")
+        routes[action] = tier
+    return routes
+
+
+class ModelRouter:
+    """
+    Elige el modelo por tipo de acción y lleva la latencia observada por modelo.
+    Las acciones sin ruta explícita usan el razonador (comportamiento original).
+    """
+
+    def __init__(
+        self,
+        reasoner_model: str = LLM_MODEL_REASONER,
+        fast_model: str = LLM_MODEL_FAST,
+        routes: str = LLM_ROUTES,
+        reasoner_budget: float = LLM_REASONER_BUDGET,
+    ):
+        self.reasoner_model = reasoner_model
+        self.fast_model = fast_model
+        self.routes = parse_routes(routes)
+        self.reasoner_budget = reasoner_budget
+        self._latencies: Dict[str, deque] = {}
+        self._timeouts: Dict[str, int] = {}
+
+    def choose(self, action_type: str | None) -> str:
+        tier = self.routes.get((action_type or "").lower(), "reasoner")
+        return self.fast_model if tier == "fast" else self.reasoner_model
+
+    def is_reasoner(self, model: str) -> bool:
+        return model == self.reasoner_model and model != self.fast_model
+
+    def record(self, model: str, seconds: float, timed_out: bool = False):
+        self._latencies.setdefault(model, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+        if timed_out:
+            self._timeouts[model] = self._timeouts.get(model, 0) + 1
+
+    def stats(self) -> Dict[str, dict]:
+        """count/p50/p95 (segundos) y timeouts por modelo."""
+        result = {}
+        for model, samples in self._latencies.items():
+            ordered = sorted(samples)
+            result[model] = {
+                "count": len(ordered),
+                "p50": round(_percentile(ordered, 0.50), 2),
+                "p95": round(_percentile(ordered, 0.95), 2),
+                "timeouts": self._timeouts.get(model, 0),
+            }
+        return result
+
+
+def _percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
@@ -1,39 +1,140 @@
+import os
+import time
+import asyncio
+from datetime import datetime, timezone
 from sqlalchemy import select, desc
-from src.core.database import get_db_session
+from src.core.database import get_async_db_session
 from src.core.models import MoodLog
 
+# Vida media (segundos) del retorno al equilibrio (0.0): el mood se reduce a la mitad en ese tiempo
+MOOD_HALF_LIFE = float(os.getenv("MOOD_HALF_LIFE", 7200))
+# Write-behind: cada cuánto se vuelcan los cambios de mood pendientes a mood_logs (segundos)
+MOOD_FLUSH_INTERVAL = int(os.getenv("MOOD_FLUSH_INTERVAL", 300))
+# Volcado anticipado al acumular este número de cambios
+MOOD_FLUSH_BATCH = int(os.getenv("MOOD_FLUSH_BATCH", 20))
+# Tope de cambios retenidos si la DB no responde (se descartan los más antiguos)
+MOOD_PENDING_MAX = 500
+
+
+def _clamp(value: float) -> float:
+    return max(-1.0, min(1.0, value))
+
+
 class MoodEngine:
-    def __init__(self):
-        self.decay_factor = 0.95  # Factor de retorno al equilibrio (0.0)
-
-    def get_current_mood(self):
-        """Recupera el último estado emocional y aplica decaimiento temporal."""
-        session_gen = get_db_session()
-        session = next(session_gen)
-        
+    """
+    Estado emocional (valence, arousal) en memoria.
+    - Se carga una vez desde el último mood_log; después leerlo no toca la DB.
+    - Decaimiento continuo hacia 0.0 según el tiempo transcurrido (vida media
+      MOOD_HALF_LIFE), no según cuántas veces se consulte.
+    - Los cambios se persisten write-behind: se acumulan y se vuelcan por lotes.
+    """
+
+    def __init__(self, half_life: float = MOOD_HALF_LIFE):
+        self.half_life = half_life
+        self.valence = 0.0
+        self.arousal = 0.0
+        self.updated_at = time.time()
+        self._loaded = False
+        self._pending: list[MoodLog] = []
+        self._flush_wakeup = asyncio.Event()
+
+    async def load(self):
+        """Recupera el último estado registrado (solo la primera vez)."""
+        if self._loaded:
+            return
+        async with get_async_db_session() as session:
+            last_log = await session.scalar(select(MoodLog).order_by(desc(MoodLog.id)).limit(1))
+        if last_log:
+            self.valence, self.arousal = last_log.valence, last_log.arousal
+            if last_log.created_at:
+                created_at = last_log.created_at
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                self.updated_at = created_at.timestamp()
+        self._loaded = True
+
+    def _decayed(self, now: float) -> tuple[float, float]:
+        elapsed = max(now - self.updated_at, 0.0)
+        factor = 0.5 ** (elapsed / self.half_life) if self.half_life > 0 else 1.0
+        return self.valence * factor, self.arousal * factor
+
+    def current(self, now: float | None = None) -> dict:
+        """Mood actual con el decaimiento aplicado; sin E/S."""
+        valence, arousal = self._decayed(time.time() if now is None else now)
+        return {
+            "valence": round(valence, 3),
+            "arousal": round(arousal, 3),
+            "description": self._describe_mood(valence, arousal)
+        }
+
+    async def get_current_mood(self):
+        """Recupera el estado emocional actual (la DB solo se consulta al arrancar)."""
+        await self.load()
+        return self.current()
+
+    def apply(self, delta_v: float, delta_a: float, stimulus_type: str, description: str | None = None,
+              now: float | None = None) -> dict:
+        """Aplica un estímulo sobre el mood decaído hasta ahora y lo encola para persistir."""
+        now = time.time() if now is None else now
+        valence, arousal = self._decayed(now)
+        # El estado en memoria ya es más nuevo que cualquier fila de la DB: no volver a cargarla
+        self._loaded = True
+        self.valence = _clamp(valence + delta_v)
+        self.arousal = _clamp(arousal + delta_a)
+        self.updated_at = now
+
+        self._pending.append(MoodLog(
+            valence=self.valence,
+            arousal=self.arousal,
+            stimulus_type=stimulus_type,
+            description=description,
+            created_at=datetime.fromtimestamp(now, timezone.utc),
+        ))
+        if len(self._pending) > MOOD_PENDING_MAX:
+            del self._pending[:-MOOD_PENDING_MAX]
+        if len(self._pending) >= MOOD_FLUSH_BATCH:
+            self._flush_wakeup.set()
+        return self.current(now)
+
+    async def flush(self) -> int:
+        """Vuelca los cambios pendientes en una transacción; devuelve cuántos se guardaron."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
         try:
-            # Obtener el último log registrado
-            last_log = session.query(MoodLog).order_by(desc(MoodLog.id)).first()
-            
-            if not last_log:
-                # Estado inicial por defecto
-                return {
-                    "valence": 0.0, 
-                    "arousal": 0.0, 
-                    "description": "Neutral (Inicio de sistema)"
-                }
-
-            # Aplicar inercia: el tiempo suaviza las emociones extremas
-            current_valence = last_log.valence * self.decay_factor
-            current_arousal = last_log.arousal * self.decay_factor
-            
-            return {
-                "valence": round(current_valence, 3),
-                "arousal": round(current_arousal, 3),
-                "description": self._describe_mood(current_valence, current_arousal)
-            }
-        finally:
-            session.close()
+            async with get_async_db_session() as session:
+                session.add_all(batch)
+                await session.commit()
+        except asyncio.CancelledError:
+            # Apagado a mitad del volcado: el lote vuelve a la cola para el flush final
+            self._restore(batch)
+            raise
+        except Exception as e:
+            print(f"⚠️ No se pudo persistir el mood ({len(batch)} cambios), se reintentará: {e}")
+            self._restore(batch)
+            return 0
+        return len(batch)
+
+    def _restore(self, batch: list[MoodLog]):
+        # Filas nuevas para el reintento: las del lote fallido quedan ligadas a su sesión
+        retry = [
+            MoodLog(valence=m.valence, arousal=m.arousal, stimulus_type=m.stimulus_type,
+                    description=m.description, created_at=m.created_at)
+            for m in batch
+        ]
+        self._pending = (retry + self._pending)[-MOOD_PENDING_MAX:]
+
+    async def run_flush_loop(self):
+        """Tarea de fondo: vuelca cada MOOD_FLUSH_INTERVAL segundos o al llenarse un lote."""
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_wakeup.wait(), timeout=MOOD_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_wakeup.clear()
+            saved = await self.flush()
+            if saved:
+                print(f"💾 Mood: {saved} cambios persistidos.")
 
     def _describe_mood(self, v, a):
         """Traduce coordenadas numéricas (Valence, Arousal) a instrucciones de texto para el LLM."""
@@ -44,4 +145,4 @@ class MoodEngine:
         return "Analítico y Distante (Neutral)."
 
 # Instancia global
-mood_engine = MoodEngine()
\ No newline at end of file
+mood_engine = MoodEngine()
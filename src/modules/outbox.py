@@ -0,0 +1,164 @@
+import os
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict
+from sqlalchemy import select
+from src.core.database import get_async_db_session
+from src.core.models import OutboxTask, SemanticMemory
+from src.modules.memory_service import memory_service
+
+# Cada cuánto se revisan tareas vencidas si nadie despierta al worker (segundos)
+OUTBOX_POLL_INTERVAL = int(os.getenv("OUTBOX_POLL_INTERVAL", 30))
+# Reintentos antes de marcar la tarea como 'failed'
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 6))
+# Backoff exponencial: base * 2^(intentos-1), con tope
+OUTBOX_BACKOFF_BASE = int(os.getenv("OUTBOX_BACKOFF_BASE", 30))
+OUTBOX_BACKOFF_MAX = 3600
+# Arriendo de una tarea reclamada: si el worker muere, otro la retoma pasado este plazo (segundos)
+OUTBOX_LEASE = 300
+OUTBOX_BATCH = 20
+
+
+async def _save_memory(task_id: int, payload: dict) -> bool:
+    """
+    Recuerdo de lo publicado. Idempotente: el id de la tarea viaja en metadata y se
+    comprueba con contención JSONB (índice GIN) antes de generar el embedding.
+    """
+    marker = {"outbox_task": task_id}
+    async with get_async_db_session() as session:
+        exists = await session.scalar(
+            select(SemanticMemory.id).where(SemanticMemory.metadata_.contains(marker)).limit(1)
+        )
+    if exists:
+        return True
+    metadata = {**payload.get("metadata", {}), **marker}
+    return await memory_service.save_memory(payload["content"], payload["source_type"], metadata=metadata)
+
+
+# task_type -> handler(task_id, payload) que devuelve True si terminó
+HANDLERS: Dict[str, Callable[[int, dict], Awaitable[bool]]] = {
+    "save_memory": _save_memory,
+}
+
+
+def backoff_for(attempts: int) -> timedelta:
+    return timedelta(seconds=min(OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX))
+
+
+class OutboxWorker:
+    """
+    Procesa en segundo plano las tareas registradas junto a cada acción.
+    - Las tareas se escriben en la misma transacción que InteractionLog.
+    - Cada tarea se reclama con FOR UPDATE SKIP LOCKED y un arriendo (seguro con varios
+      procesos); el handler corre fuera de la transacción y el resultado se registra en otra.
+    - Fallos: reintento con backoff exponencial hasta OUTBOX_MAX_ATTEMPTS.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[int, dict], Awaitable[bool]]] = HANDLERS):
+        self.handlers = handlers
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        """Procesar ya (tras registrar una acción) en lugar de esperar al sondeo."""
+        self._wakeup.set()
+
+    async def _due_ids(self) -> list:
+        async with get_async_db_session() as session:
+            rows = await session.scalars(
+                select(OutboxTask.id)
+                .where(OutboxTask.status == "pending")
+                .where(OutboxTask.next_attempt_at <= datetime.now(timezone.utc))
+                .order_by(OutboxTask.next_attempt_at)
+                .limit(OUTBOX_BATCH)
+            )
+            return list(rows)
+
+    async def _claim(self, task_id: int):
+        """
+        Transacción corta 1: reclama la tarea (SKIP LOCKED) y la arrienda moviendo
+        next_attempt_at; si el proceso muere a mitad, vuelve a estar vencida al expirar.
+        """
+        async with get_async_db_session() as session:
+            task = await session.scalar(
+                select(OutboxTask)
+                .where(OutboxTask.id == task_id, OutboxTask.status == "pending")
+                .where(OutboxTask.next_attempt_at <= datetime.now(timezone.utc))
+                .with_for_update(skip_locked=True)
+            )
+            if task is None:
+                return None
+            task.attempts += 1
+            task.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=OUTBOX_LEASE)
+            claimed = (task.task_type, task.payload, task.attempts)
+            await session.commit()
+            return claimed
+
+    async def _finish(self, task_id: int, attempts: int, error: str | None):
+        """Transacción corta 2: registra el resultado del handler."""
+        async with get_async_db_session() as session:
+            task = await session.scalar(select(OutboxTask).where(OutboxTask.id == task_id).with_for_update())
+            if task is None or task.attempts != attempts:
+                # Otro worker la retomó al expirar el arriendo: su resultado manda
+                return
+            if error is None:
+                task.status = "done"
+                task.last_error = None
+            else:
+                task.last_error = error
+                if attempts >= OUTBOX_MAX_ATTEMPTS:
+                    task.status = "failed"
+                    print(f"🚨 Outbox: tarea {task_id} ({task.task_type}) descartada tras {attempts} intentos: {error}")
+                else:
+                    task.next_attempt_at = datetime.now(timezone.utc) + backoff_for(attempts)
+                    print(f"🔁 Outbox: tarea {task_id} reintentará en {backoff_for(attempts)} ({error})")
+            await session.commit()
+
+    async def _process(self, task_id: int) -> bool | None:
+        """
+        Ejecuta una tarea; None si otro proceso la tiene o ya no está pendiente.
+        El handler (API de embeddings, su propia sesión) corre fuera de toda transacción:
+        no se retiene ni un lock ni una conexión del pool durante la llamada de red.
+        """
+        claimed = await self._claim(task_id)
+        if claimed is None:
+            return None
+        task_type, payload, attempts = claimed
+
+        handler = self.handlers.get(task_type)
+        try:
+            if handler is None:
+                raise ValueError(f"task_type desconocido: {task_type}")
+            ok = await handler(task_id, payload)
+            error = None if ok else "handler devolvió False"
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+
+        await self._finish(task_id, attempts, error)
+        return ok
+
+    async def process_due(self) -> int:
+        """Procesa las tareas vencidas; devuelve cuántas terminaron."""
+        done = 0
+        for task_id in await self._due_ids():
+            if await self._process(task_id):
+                done += 1
+        return done
+
+    async def run_loop(self):
+        """Tarea de fondo: procesa al despertar o cada OUTBOX_POLL_INTERVAL segundos."""
+        while True:
+            try:
+                done = await self.process_due()
+                if done:
+                    print(f"📤 Outbox: {done} tareas completadas.")
+            except Exception as e:
+                print(f"⚠️ Error procesando outbox: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+# Instancia global
+outbox_worker = OutboxWorker()
@@ -0,0 +1,130 @@
+import os
+import math
+import time
+import random
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List
+from sqlalchemy import select
+from src.core.database import get_async_db_session
+from src.core.models import InteractionLog
+
+CHECK_INTERVAL_MIN = int(os.getenv("CHECK_INTERVAL_MIN", 300))
+CHECK_INTERVAL_MAX = int(os.getenv("CHECK_INTERVAL_MAX", 900))
+# 0 = intervalo aleatorio clásico entre MIN y MAX
+SCHEDULER_ADAPTIVE = os.getenv("SCHEDULER_ADAPTIVE", "1") == "1"
+# Vida media (segundos) de la tasa de llegadas observada en vivo
+SCHEDULER_HALF_LIFE = float(os.getenv("SCHEDULER_HALF_LIFE", 3600))
+# Días de interaction_logs usados para el perfil por hora del día
+SCHEDULER_LOOKBACK_DAYS = int(os.getenv("SCHEDULER_LOOKBACK_DAYS", 14))
+# Llegadas esperadas por sondeo: 1 = sondear aprox. una vez por tweet nuevo
+SCHEDULER_TARGET_PER_POLL = float(os.getenv("SCHEDULER_TARGET_PER_POLL", 1.0))
+# Jitter relativo sobre el intervalo calculado (OpSec: nunca un periodo fijo)
+SCHEDULER_JITTER = 0.15
+# Cada cuánto se recalcula el perfil horario desde la DB (segundos)
+PROFILE_REFRESH_INTERVAL = 24 * 3600
+SEEN_IDS_LIMIT = 2000
+# Acciones que responden a una llegada (el daily_post no cuenta)
+ARRIVAL_ACTIONS = ("shadow_reply", "shadow_quote")
+
+
+class AdaptivePollScheduler:
+    """
+    Intervalo de sondeo según la actividad observada del host y las menciones.
+    - Tasa en vivo: EWMA (con vida media) de IDs nuevos por segundo vistos en cada percepción.
+    - Perfil por hora del día (UTC): respuestas registradas en interaction_logs.
+    - Intervalo ≈ SCHEDULER_TARGET_PER_POLL / max(tasa en vivo, tasa de la hora actual),
+      acotado a [CHECK_INTERVAL_MIN, CHECK_INTERVAL_MAX] y con jitter.
+    """
+
+    def __init__(
+        self,
+        min_interval: int = CHECK_INTERVAL_MIN,
+        max_interval: int = CHECK_INTERVAL_MAX,
+        half_life: float = SCHEDULER_HALF_LIFE,
+        target_per_poll: float = SCHEDULER_TARGET_PER_POLL,
+        lookback_days: int = SCHEDULER_LOOKBACK_DAYS,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.half_life = half_life
+        self.target_per_poll = target_per_poll
+        self.lookback_days = lookback_days
+        self.rate = 0.0                      # llegadas/segundo (EWMA)
+        self.hourly_rate: List[float] = [0.0] * 24
+        self.profile_loaded_at = 0.0
+        self._last_observed = None
+        self._seen = deque(maxlen=SEEN_IDS_LIMIT)
+        self._seen_set = set()
+
+    def observe(self, ids: Iterable[str | None], now: float | None = None) -> int:
+        """Registra los IDs de una percepción; devuelve cuántos no se habían visto."""
+        now = time.time() if now is None else now
+        new = [i for i in dict.fromkeys(ids) if i and i not in self._seen_set]
+        for tweet_id in new:
+            if len(self._seen) == self._seen.maxlen:
+                self._seen_set.discard(self._seen[0])
+            self._seen.append(tweet_id)
+            self._seen_set.add(tweet_id)
+
+        if self._last_observed is None:
+            # Primera lectura: solo fija la referencia (todo parece "nuevo" al arrancar)
+            self._last_observed = now
+            return 0
+        elapsed = max(now - self._last_observed, 1.0)
+        self._last_observed = now
+        alpha = 1.0 - 0.5 ** (elapsed / self.half_life)
+        self.rate += alpha * (len(new) / elapsed - self.rate)
+        return len(new)
+
+    def load_profile(self, timestamps: Iterable[datetime], now: float | None = None):
+        """Tasa media por hora del día (UTC) a partir de las llegadas históricas."""
+        counts = [0] * 24
+        for ts in timestamps:
+            if ts.tzinfo is None:
+                ts = ts.replace(tzinfo=timezone.utc)
+            counts[ts.astimezone(timezone.utc).hour] += 1
+        seconds_per_hour_slot = self.lookback_days * 3600
+        self.hourly_rate = [count / seconds_per_hour_slot for count in counts]
+        self.profile_loaded_at = time.time() if now is None else now
+
+    def profile_stale(self, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        return now - self.profile_loaded_at > PROFILE_REFRESH_INTERVAL
+
+    async def refresh_profile(self):
+        """Relee de interaction_logs las respuestas de los últimos SCHEDULER_LOOKBACK_DAYS."""
+        since = datetime.now(timezone.utc) - timedelta(days=self.lookback_days)
+        try:
+            async with get_async_db_session() as session:
+                rows = await session.scalars(
+                    select(InteractionLog.created_at)
+                    .where(InteractionLog.created_at >= since)
+                    .where(InteractionLog.action_type.in_(ARRIVAL_ACTIONS))
+                )
+                self.load_profile(rows.all())
+            print(f"📈 Perfil de actividad cargado ({self.lookback_days} días).")
+        except Exception as e:
+            print(f"⚠️ No se pudo cargar el perfil de actividad: {e}")
+            # Reintentar en el próximo ciclo sin bloquear el sondeo
+            self.profile_loaded_at = time.time() - PROFILE_REFRESH_INTERVAL + 600
+
+    def expected_rate(self, now: float | None = None) -> float:
+        now = time.time() if now is None else now
+        hour = datetime.fromtimestamp(now, timezone.utc).hour
+        return max(self.rate, self.hourly_rate[hour])
+
+    def next_interval(self, now: float | None = None) -> int:
+        """Segundos hasta el próximo ciclo."""
+        if not SCHEDULER_ADAPTIVE:
+            return random.randint(self.min_interval, self.max_interval)
+        rate = self.expected_rate(now)
+        base = self.target_per_poll / rate if rate > 0 else math.inf
+        base = min(self.max_interval, max(self.min_interval, base))
+        low = max(self.min_interval, base * (1 - SCHEDULER_JITTER))
+        high = min(self.max_interval, base * (1 + SCHEDULER_JITTER))
+        return int(random.uniform(low, high))
+
+
+# Instancia global
+poll_scheduler = AdaptivePollScheduler()
@@ -2,15 +2,24 @@ from dataclasses import dataclass
 from datetime import datetime, time
 from typing import Any, List, Optional
 import random
+from src.modules.tweet_record import TweetRecord
 
 
 @dataclass
 class ActionPlan:
     action_type: str                     # 'host', 'mention', 'daily'
-    target_tweet: Optional[Any] = None   # Objeto Twikit u otro contenedor con id/text
+    target_tweet: Optional[Any] = None   # TweetRecord (o cualquier contenedor con id/text)
     should_quote: bool = False           # True = quote, False = reply/post
     reason: str = ""                     # Breve explicación para logs
     target_text: str = ""                # Texto base cuando no hay tweet origen (daily)
+    priority: float = 0.0                # Mayor = se atiende antes en la cola de trabajo
+
+
+# Prioridad base por tipo de acción; el engagement desempata dentro de cada tipo
+PRIORITY_HOST = 300.0
+PRIORITY_DAILY = 200.0
+PRIORITY_MENTION = 100.0
+ENGAGEMENT_BONUS_CAP = 50.0
 
 
 class InteractionStateMachine:
@@ -20,51 +29,72 @@ class InteractionStateMachine:
     - Daily post antes de las 22:00, 1 vez al día.
     - Responder menciones de otros usuarios con el mismo tono.
     - Preferir quote si el tweet tiene engagement (>2 likes o >2 RTs).
+    `plan_actions` puntúa todos los candidatos (para la cola de trabajo);
+    `decide_action` devuelve solo el más prioritario.
     """
 
-    def decide_action(
+    def plan_actions(
         self,
-        host_tweet: Optional[Any],
+        host_tweets: List[Any],
         mentions: List[Any],
         allow_daily: bool,
         current_time: datetime,
-    ) -> Optional[ActionPlan]:
-        """Devuelve un plan de acción o None si no hay nada que hacer."""
-
-        # 1. Prioridad: Responder al host si hay tweet pendiente
-        if host_tweet and not self._should_ignore(host_tweet):
-            should_quote = self._should_quote(host_tweet)
-            return ActionPlan(
+    ) -> List[ActionPlan]:
+        """Todos los planes posibles, ordenados por prioridad descendente."""
+        plans = []
+
+        # 1. Host: siempre primero si hay tweets pendientes
+        for host_tweet in host_tweets:
+            record = TweetRecord.coerce(host_tweet)
+            if self._should_ignore(record):
+                continue
+            plans.append(ActionPlan(
                 action_type="host",
                 target_tweet=host_tweet,
-                should_quote=should_quote,
+                should_quote=self._should_quote(record),
                 reason="Reply al host pendiente",
-            )
+                priority=PRIORITY_HOST + self._engagement_bonus(record),
+            ))
 
         # 2. Daily post (solo antes de las 22:00)
         if allow_daily and current_time.time() < time(22, 0):
-            return ActionPlan(
+            plans.append(ActionPlan(
                 action_type="daily",
                 target_tweet=None,
                 should_quote=False,
                 reason="Publicación diaria antes de las 22:00",
                 target_text="Genera una reflexión bizarra diaria sin tweet de referencia.",
-            )
-
-        # 3. Responder menciones (tono bizarro)
-        if mentions:
-            mention = mentions[0]  # Estrategia simple: primera mención pendiente
-            if not self._should_ignore(mention):
-                should_quote = self._should_quote(mention)
-                return ActionPlan(
-                    action_type="mention",
-                    target_tweet=mention,
-                    should_quote=should_quote,
-                    reason="Responder mención pendiente",
-                )
-
-        # Nada que hacer
-        return None
+                priority=PRIORITY_DAILY,
+            ))
+
+        # 3. Menciones (tono bizarro): las de más engagement primero
+        for mention in mentions:
+            record = TweetRecord.coerce(mention)
+            if self._should_ignore(record):
+                continue
+            plans.append(ActionPlan(
+                action_type="mention",
+                target_tweet=mention,
+                should_quote=self._should_quote(record),
+                reason="Responder mención pendiente",
+                priority=PRIORITY_MENTION + self._engagement_bonus(record),
+            ))
+
+        # sort es estable: a igual prioridad se respeta el orden de llegada
+        plans.sort(key=lambda plan: plan.priority, reverse=True)
+        return plans
+
+    def decide_action(
+        self,
+        host_tweet: Optional[Any],
+        mentions: List[Any],
+        allow_daily: bool,
+        current_time: datetime,
+    ) -> Optional[ActionPlan]:
+        """Devuelve el plan más prioritario o None si no hay nada que hacer."""
+        host_tweets = [host_tweet] if host_tweet else []
+        plans = self.plan_actions(host_tweets, mentions, allow_daily, current_time)
+        return plans[0] if plans else None
 
     def _should_ignore(self, tweet: Any) -> bool:
         """
@@ -72,10 +102,11 @@ class InteractionStateMachine:
         - Texto muy corto (<40 caracteres).
         - Tiene media (imagen/video) y texto <150.
         """
-        text = self._get_text(tweet)
-        if len(text.strip()) < 40:
+        record = TweetRecord.coerce(tweet)
+        text = record.text.strip()
+        if len(text) < 40:
             return True
-        if self._has_media(tweet) and len(text.strip()) < 150:
+        if record.has_media and len(text) < 150:
             return True
         return False
 
@@ -85,53 +116,17 @@ class InteractionStateMachine:
         Si likes>2 o retweets>2 aumenta probabilidad de quote (70%).
         Si no, usa probabilidad base 50%.
         """
-        likes = self._get_metric(tweet, ["favorite_count", "favourites_count", "like_count"])
-        rts = self._get_metric(tweet, ["retweet_count", "repost_count"])
+        record = TweetRecord.coerce(tweet)
+        likes, rts = record.like_count, record.retweet_count
 
         high_engagement = (likes is not None and likes > 2) or (rts is not None and rts > 2)
         prob_quote = 0.7 if high_engagement else 0.5
         return random.random() < prob_quote
 
-    @staticmethod
-    def _get_metric(tweet: Any, possible_attrs: List[str]) -> Optional[int]:
-        """Lee de forma segura una métrica de likes/RTs si existe."""
-        for attr in possible_attrs:
-            if hasattr(tweet, attr):
-                try:
-                    return int(getattr(tweet, attr))
-                except (TypeError, ValueError):
-                    continue
-            # Si viene como dict
-            if isinstance(tweet, dict) and attr in tweet:
-                try:
-                    return int(tweet[attr])
-                except (TypeError, ValueError):
-                    continue
-        return None
-
-    @staticmethod
-    def _get_text(tweet: Any) -> str:
-        """Extrae texto del tweet compatible con objeto o dict."""
-        if tweet is None:
-            return ""
-        if hasattr(tweet, "text"):
-            return getattr(tweet, "text", "") or ""
-        if isinstance(tweet, dict):
-            return str(tweet.get("text", ""))
-        return str(tweet)
-
-    @staticmethod
-    def _has_media(tweet: Any) -> bool:
-        """Detecta presencia de imágenes o video en atributos comunes."""
-        media_fields = ["media", "photos", "photo", "video", "videos", "media_keys"]
-        for field in media_fields:
-            if hasattr(tweet, field):
-                val = getattr(tweet, field, None)
-                if val:
-                    return True
-            if isinstance(tweet, dict) and field in tweet and tweet[field]:
-                return True
-        return False
+    def _engagement_bonus(self, tweet: Any) -> float:
+        """Likes + RTs, acotado para no saltar de tipo de acción."""
+        record = TweetRecord.coerce(tweet)
+        return min(float((record.like_count or 0) + (record.retweet_count or 0)), ENGAGEMENT_BONUS_CAP)
 
 
 # Instancia global
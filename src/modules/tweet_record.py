@@ -0,0 +1,126 @@
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+ID_FIELDS = ("id", "tweet_id", "status_id", "target_status_id", "conversation_id")
+NESTED_FIELDS = ("tweet", "status")
+LIKE_FIELDS = ("favorite_count", "favourites_count", "like_count")
+RETWEET_FIELDS = ("retweet_count", "repost_count")
+MEDIA_FIELDS = ("media", "photos", "photo", "video", "videos", "media_keys")
+
+
+def _get(obj: Any, name: str) -> Any:
+    """Lee un atributo o clave de un objeto Twikit o dict."""
+    if isinstance(obj, dict):
+        return obj.get(name)
+    try:
+        return getattr(obj, name, None)
+    except (KeyError, TypeError, ValueError):
+        # Propiedades de Twikit que leen claves ausentes del JSON crudo
+        return None
+
+
+def _probe_id(obj: Any) -> Optional[str]:
+    """ID del tweet; busca en atributos comunes y en contenedores anidados (notificaciones)."""
+    if obj is None:
+        return None
+    for name in ID_FIELDS:
+        value = _get(obj, name)
+        if value:
+            return str(value)
+    for name in NESTED_FIELDS:
+        nested = _get(obj, name)
+        if nested is not None:
+            nested_id = _probe_id(nested)
+            if nested_id:
+                return nested_id
+    return None
+
+
+def _probe_metric(obj: Any, names: Sequence[str]) -> Optional[int]:
+    for name in names:
+        value = _get(obj, name)
+        if value is None:
+            continue
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class TweetRecord:
+    """
+    Representación compacta de un tweet, creada una sola vez en la percepción.
+    Sustituye al sondeo repetido con hasattr/dict sobre objetos Twikit en el ciclo
+    y la máquina de estados. `__slots__`: sin __dict__ por instancia.
+    """
+
+    __slots__ = (
+        "id",
+        "author_id",
+        "author_name",
+        "text",
+        "like_count",
+        "retweet_count",
+        "has_media",
+        "in_reply_to",
+        "created_at",
+    )
+
+    def __init__(
+        self,
+        id: Optional[str],
+        text: str = "",
+        author_id: Optional[str] = None,
+        author_name: Optional[str] = None,
+        like_count: Optional[int] = None,
+        retweet_count: Optional[int] = None,
+        has_media: bool = False,
+        in_reply_to: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+    ):
+        self.id = id
+        self.text = text
+        self.author_id = author_id
+        self.author_name = author_name
+        self.like_count = like_count
+        self.retweet_count = retweet_count
+        self.has_media = has_media
+        self.in_reply_to = in_reply_to
+        self.created_at = created_at
+
+    @classmethod
+    def from_raw(cls, obj: Any) -> "TweetRecord":
+        """Convierte un Tweet/Notification de Twikit, un dict o un texto plano."""
+        if isinstance(obj, str):
+            return cls(id=None, text=obj)
+        if isinstance(obj, dict):
+            text = str(obj.get("text") or "")
+        elif hasattr(obj, "text"):
+            text = obj.text or ""
+        else:
+            text = str(obj)
+        author = _get(obj, "user")
+        created_at = _get(obj, "created_at_datetime")
+        return cls(
+            id=_probe_id(obj),
+            text=text,
+            author_id=str(_get(author, "id")) if author is not None and _get(author, "id") else None,
+            author_name=_get(author, "screen_name") if author is not None else None,
+            like_count=_probe_metric(obj, LIKE_FIELDS),
+            retweet_count=_probe_metric(obj, RETWEET_FIELDS),
+            has_media=any(_get(obj, name) for name in MEDIA_FIELDS),
+            in_reply_to=_get(obj, "in_reply_to"),
+            created_at=created_at if isinstance(created_at, datetime) else None,
+        )
+
+    @classmethod
+    def coerce(cls, obj: Any) -> Optional["TweetRecord"]:
+        """Devuelve el mismo record o lo crea; None se mantiene como None."""
+        if obj is None or isinstance(obj, cls):
+            return obj
+        return cls.from_raw(obj)
+
+    def __repr__(self) -> str:
+        author = f"@{self.author_name}" if self.author_name else self.author_id
+        return f"<Tweet id={self.id} author={author} likes={self.like_count} rts={self.retweet_count} text='{self.text[:40]}'>"
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import List
+from sqlalchemy import select
+from src.core.database import get_async_db_session
+from src.core.models import SemanticMemory, MemoryHit
+
+try:
+    import numpy as np
+except ImportError:  # Dependencia opcional: solo necesaria con MEMORY_LOCAL_REPLICA=1
+    np = None
+
+MEMORY_LOCAL_REPLICA = os.getenv("MEMORY_LOCAL_REPLICA", "0") == "1"
+MEMORY_REPLICA_DIR = Path(os.getenv("MEMORY_REPLICA_DIR", "data/vector_replica"))
+# Cada cuánto se leen filas nuevas de semantic_memory (segundos)
+MEMORY_REPLICA_SYNC_INTERVAL = int(os.getenv("MEMORY_REPLICA_SYNC_INTERVAL", 30))
+# Si la última sincronización correcta es más antigua que esto, se usa Postgres
+MEMORY_REPLICA_MAX_LAG = int(os.getenv("MEMORY_REPLICA_MAX_LAG", 300))
+# Filas por consulta al sincronizar
+MEMORY_REPLICA_BATCH = int(os.getenv("MEMORY_REPLICA_BATCH", 5000))
+# Margen de IDs que se vuelven a leer: una transacción puede confirmar un id menor después
+MEMORY_REPLICA_LOOKBACK = 200
+
+
+class LocalVectorReplica:
+    """
+    Réplica local de semantic_memory para recuperar recuerdos sin ir a Postgres.
+    - embeddings.f32: matriz float32 normalizada (memory-mapped), una fila por recuerdo.
+    - ids.i64: id de cada fila.
+    - meta.jsonl: content/source_type/created_at de cada fila.
+    Se alimenta leyendo filas con id > último id visto. Postgres sigue siendo la
+    fuente de verdad y el fallback cuando la réplica está desactualizada.
+    """
+
+    def __init__(self, directory: Path = MEMORY_REPLICA_DIR):
+        self.directory = Path(directory)
+        self._matrix = None
+        self._ids = None
+        self._meta: List[dict] = []
+        self._recent_ids: deque = deque(maxlen=MEMORY_REPLICA_LOOKBACK * 5)
+        self.last_id = 0
+        self.last_sync_ok = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def _paths(self):
+        return (
+            self.directory / "embeddings.f32",
+            self.directory / "ids.i64",
+            self.directory / "meta.jsonl",
+        )
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def is_fresh(self) -> bool:
+        return self._matrix is not None and (time.time() - self.last_sync_ok) <= MEMORY_REPLICA_MAX_LAG
+
+    def load(self):
+        """Abre los ficheros existentes; tolera escrituras incompletas tras un crash."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        emb_path, ids_path, meta_path = self._paths
+        meta = []
+        if meta_path.exists():
+            with meta_path.open(encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        meta.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # línea truncada: todo lo posterior se descarta
+        ids = np.fromfile(ids_path, dtype=np.int64) if ids_path.exists() else np.empty(0, dtype=np.int64)
+        rows = min(len(meta), len(ids))
+        dim = meta[0]["dim"] if meta else 0
+        if rows and emb_path.exists():
+            rows = min(rows, emb_path.stat().st_size // (4 * dim))
+        self._truncate(rows, dim)
+        self._meta = meta[:rows]
+        self._source_types, self._created_ts = self._filter_columns(self._meta)
+        self._remap(dim)
+        self.last_id = int(self._ids[-1]) if rows else 0
+        self._recent_ids.extend(int(i) for i in self._ids[-self._recent_ids.maxlen:])
+        print(f"🧭 Réplica vectorial local cargada: {rows} recuerdos (último id={self.last_id})")
+
+    def _truncate(self, rows: int, dim: int):
+        emb_path, ids_path, meta_path = self._paths
+        for path, size in ((emb_path, rows * dim * 4), (ids_path, rows * 8)):
+            if path.exists() and path.stat().st_size != size:
+                with path.open("r+b") as f:
+                    f.truncate(size)
+        if meta_path.exists():
+            lines = meta_path.read_text(encoding="utf-8").splitlines(keepends=True)
+            if len(lines) != rows:
+                meta_path.write_text("".join(lines[:rows]), encoding="utf-8")
+
+    @staticmethod
+    def _filter_columns(entries: List[dict]):
+        """Columnas de filtrado (source_type, created_at como epoch; NaN si falta) de `entries`."""
+        source_types = np.array([m["source_type"] or "" for m in entries], dtype=object)
+        created_ts = np.array(
+            [datetime.fromisoformat(m["created_at"]).timestamp() if m["created_at"] else np.nan
+             for m in entries],
+            dtype=np.float64,
+        )
+        return source_types, created_ts
+
+    def _remap(self, dim: int):
+        emb_path, ids_path, _ = self._paths
+        rows = len(self._meta)
+        if rows == 0:
+            self._matrix = np.empty((0, dim), dtype=np.float32)
+            self._ids = np.empty(0, dtype=np.int64)
+            return
+        self._matrix = np.memmap(emb_path, dtype=np.float32, mode="r", shape=(rows, dim))
+        self._ids = np.memmap(ids_path, dtype=np.int64, mode="r", shape=(rows,))
+
+    def _write_rows(self, rows):
+        """
+        Escribe en disco las filas (id, content, source_type, created_at, embedding) nuevas.
+        Sin tocar el estado en memoria: se ejecuta en un hilo mientras `search` sigue
+        sirviendo desde el event loop. Devuelve (entradas, columnas de filtrado, dim) o None.
+        """
+        recent = set(self._recent_ids)
+        rows = [r for r in rows if r.id not in recent and r.embedding is not None]
+        if not rows:
+            return None
+        matrix = np.asarray([list(r.embedding) for r in rows], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        dim = matrix.shape[1]
+
+        entries = [
+            {
+                "id": r.id,
+                "content": r.content,
+                "source_type": r.source_type,
+                "created_at": r.created_at.isoformat() if r.created_at else None,
+                "dim": dim,
+            }
+            for r in rows
+        ]
+        emb_path, ids_path, meta_path = self._paths
+        with emb_path.open("ab") as f:
+            f.write(matrix.tobytes())
+        with ids_path.open("ab") as f:
+            f.write(np.asarray([r.id for r in rows], dtype=np.int64).tobytes())
+        with meta_path.open("a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+        return entries, self._filter_columns(entries), dim
+
+    def _commit_rows(self, written):
+        """Incorpora al estado en memoria lo escrito por `_write_rows` (solo las filas nuevas)."""
+        if written is None:
+            return
+        entries, (source_types, created_ts), dim = written
+        self._meta.extend(entries)
+        self._recent_ids.extend(entry["id"] for entry in entries)
+        self._source_types = np.concatenate([self._source_types, source_types])
+        self._created_ts = np.concatenate([self._created_ts, created_ts])
+        self._remap(dim)
+
+    def _append(self, rows):
+        """Añade filas a disco y a memoria (versión síncrona de lo que hace `sync`)."""
+        self._commit_rows(self._write_rows(rows))
+
+    async def sync(self):
+        """Lee de Postgres las filas posteriores al último id replicado."""
+        async with self._lock:
+            if self._matrix is None:
+                # E/S de ficheros (y posible reescritura de meta.jsonl) fuera del event loop
+                await asyncio.to_thread(self.load)
+            try:
+                since = max(0, self.last_id - MEMORY_REPLICA_LOOKBACK)
+                while True:
+                    async with get_async_db_session() as session:
+                        rows = (await session.execute(
+                            select(
+                                SemanticMemory.id,
+                                SemanticMemory.content,
+                                SemanticMemory.source_type,
+                                SemanticMemory.created_at,
+                                SemanticMemory.embedding,
+                            )
+                            .where(SemanticMemory.id > since)
+                            .order_by(SemanticMemory.id)
+                            .limit(MEMORY_REPLICA_BATCH)
+                        )).all()
+                    if not rows:
+                        break
+                    self._commit_rows(await asyncio.to_thread(self._write_rows, rows))
+                    since = rows[-1].id
+                    self.last_id = max(self.last_id, since)
+                    if len(rows) < MEMORY_REPLICA_BATCH:
+                        break
+                self.last_sync_ok = time.time()
+            except Exception as e:
+                print(f"⚠️ Error sincronizando réplica vectorial: {e}")
+
+    async def run_sync_loop(self):
+        """Tarea de fondo: mantiene la réplica al día."""
+        while True:
+            await self.sync()
+            await asyncio.sleep(MEMORY_REPLICA_SYNC_INTERVAL)
+
+    def search(self, query_vector, limit: int = 3, source_types=None, since=None,
+               min_similarity=None) -> List[MemoryHit]:
+        """Top-k por similitud coseno con un producto matriz-vector (filtros aplicados como máscara)."""
+        if self._matrix is None or len(self) == 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        scores = self._matrix @ (query / norm)
+
+        mask = np.ones(len(scores), dtype=bool)
+        if source_types:
+            mask &= np.isin(self._source_types, list(source_types))
+        if since is not None:
+            mask &= self._created_ts >= since.timestamp()
+        if min_similarity is not None:
+            mask &= scores >= min_similarity
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return []
+
+        k = min(limit, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [
+            MemoryHit(
+                id=self._meta[i]["id"],
+                content=self._meta[i]["content"],
+                source_type=self._meta[i]["source_type"],
+                distance=float(1.0 - scores[i]),
+            )
+            for i in top
+        ]
+
+
+def build_replica() -> LocalVectorReplica | None:
+    """Devuelve la réplica si está habilitada y numpy está disponible."""
+    if not MEMORY_LOCAL_REPLICA:
+        return None
+    if np is None:
+        print("⚠️ MEMORY_LOCAL_REPLICA=1 requiere numpy (pip install numpy). Se usará Postgres.")
+        return None
+    return LocalVectorReplica()
@@ -0,0 +1,71 @@
+import os
+import heapq
+import asyncio
+import itertools
+from typing import Awaitable, Callable, Hashable, List, Optional, Tuple
+from src.modules.state_machine import ActionPlan
+
+# Acciones máximas por ciclo (OpSec: limita ráfagas de publicaciones)
+ACTIONS_PER_CYCLE = int(os.getenv("ACTIONS_PER_CYCLE", 3))
+# Workers que procesan la cola en paralelo (LLM + publicación)
+ACTION_WORKERS = int(os.getenv("ACTION_WORKERS", 2))
+
+
+class ActionQueue:
+    """
+    Cola de prioridad de ActionPlan alimentada por la percepción.
+    - Mayor `priority` sale primero; a igual prioridad, orden de llegada.
+    - Deduplica por clave (tweet_id o tipo de acción) para no atender dos veces el mismo target.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, ActionPlan]] = []
+        self._counter = itertools.count()
+        self._keys = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, plan: ActionPlan, key: Hashable) -> bool:
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        heapq.heappush(self._heap, (-plan.priority, next(self._counter), plan))
+        return True
+
+    def pop(self) -> Optional[ActionPlan]:
+        if not self._heap:
+            return None
+        return heapq.heappop(self._heap)[2]
+
+
+async def drain(
+    queue: ActionQueue,
+    handler: Callable[[ActionPlan], Awaitable[bool]],
+    workers: int = ACTION_WORKERS,
+    budget: int = ACTIONS_PER_CYCLE,
+) -> int:
+    """
+    Vacía la cola con un pool de `workers` hasta agotar el presupuesto de acciones.
+    El presupuesto cuenta acciones iniciadas (cada una cuesta una llamada al LLM);
+    los targets no atendidos vuelven a aparecer en la próxima percepción.
+    Devuelve cuántas acciones terminaron con éxito.
+    """
+    remaining = budget
+    completed = 0
+
+    async def worker():
+        nonlocal remaining, completed
+        while remaining > 0:
+            plan = queue.pop()
+            if plan is None:
+                return
+            remaining -= 1
+            try:
+                if await handler(plan):
+                    completed += 1
+            except Exception as e:
+                print(f"❌ Error procesando acción {plan.action_type}: {type(e).__name__}: {e}")
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    return completed
@@ -4,15 +4,27 @@ import asyncio
 import inspect
 from twikit import Client
 from tenacity import retry, stop_after_attempt, wait_exponential
+from src.core.state_store import get_state, set_state, contiguous_watermark
 
 # Rutas de archivos
 COOKIES_PATH = "data/cookies/cookies.json"
 
+# Ingesta incremental de notificaciones (watermark = timestamp_ms persistido en agent_state)
+MENTIONS_WATERMARK_KEY = "notifications_watermark"
+MENTIONS_PAGE_SIZE = 40
+# Páginas máximas por ciclo y notificaciones consideradas en el primer arranque
+MENTIONS_MAX_PAGES = int(os.getenv("MENTIONS_MAX_PAGES", 5))
+MENTIONS_BOOTSTRAP_LIMIT = 10
+
 class XClient:
     def __init__(self):
         # Inicializamos el cliente simulando ser Chrome en Windows o Linux
         self.client = Client(language="es-MX")
         self.user = None
+        self.mentions_watermark = None
+        self._mentions_loaded = False
+        # (timestamp_ms, tweet_id) de la última ingesta, para avanzar el watermark
+        self._mention_marks = []
         # Cacheamos la firma de create_tweet para compatibilidad de versiones
         try:
             self._create_tweet_params = set(inspect.signature(self.client.create_tweet).parameters.keys())
@@ -93,17 +105,69 @@ class XClient:
         # Último recurso: menciona manualmente al usuario al responder
         return await self.client.create_tweet(text)
 
-    async def get_my_latest_mentions(self, limit=10, notif_type="all"):
+    async def get_new_mentions(self, max_pages: int = MENTIONS_MAX_PAGES):
         """
-        Obtiene menciones para el ciclo de respuesta.
-        Twikit requiere el parámetro 'type' en get_notifications (ej. 'all', 'mention').
+        Menciones llegadas desde el último watermark, de la más antigua a la más nueva.
+        - Pagina con el cursor de twikit solo mientras la página completa sea nueva.
+        - Filtra en el cliente: solo tweets de terceros que nos mencionan o responden
+          (likes, follows y retweets de nuestros tweets no llegan al ciclo).
+        - Devuelve los tweets (no las notificaciones), así id/métricas son las del tweet.
         """
         if not self.user:
             await self.login()
-        
-        # Nota: Twikit recupera notificaciones, hay que filtrar menciones
-        # Esta es una implementación simplificada para prueba
-        return await self.client.get_notifications(type=notif_type, count=limit)
+        if not self._mentions_loaded:
+            value = await get_state(MENTIONS_WATERMARK_KEY)
+            self.mentions_watermark = int(value) if value else None
+            self._mentions_loaded = True
+
+        watermark = self.mentions_watermark
+        self._mention_marks = []
+        page = await self.client.get_notifications(type="All", count=MENTIONS_PAGE_SIZE)
+        fresh = []
+        pages = 1
+        while page:
+            new = [n for n in page if n.timestamp_ms > (watermark or 0)]
+            fresh.extend(new)
+            if watermark is None or len(new) < len(page) or not getattr(page, "next_cursor", None):
+                break
+            if pages >= max_pages:
+                print(f"⚠️ Límite de {max_pages} páginas de notificaciones alcanzado; las más antiguas se omiten.")
+                break
+            page = await page.next()
+            pages += 1
+
+        fresh.sort(key=lambda n: n.timestamp_ms)
+        if watermark is None:
+            # Primer arranque: solo las más recientes (como la ventana fija anterior)
+            fresh = fresh[-MENTIONS_BOOTSTRAP_LIMIT:]
+
+        mentions = {}
+        for n in fresh:
+            tweet_id = str(n.tweet.id) if self._is_mention(n) else None
+            self._mention_marks.append((n.timestamp_ms, tweet_id))
+            if tweet_id:
+                mentions.setdefault(tweet_id, n.tweet)
+        print(f"🔔 Notificaciones nuevas: {len(fresh)} ({pages} páginas), menciones: {len(mentions)}")
+        return list(mentions.values())
+
+    def _is_mention(self, notification) -> bool:
+        tweet = getattr(notification, "tweet", None)
+        if tweet is None:
+            return False
+        author = getattr(tweet, "user", None)
+        if author is not None and str(author.id) == str(self.user.id):
+            return False  # interacción sobre un tweet propio (like, RT)
+        text = (getattr(tweet, "full_text", None) or getattr(tweet, "text", "") or "").lower()
+        return f"@{self.user.screen_name}".lower() in text or bool(getattr(tweet, "in_reply_to", None))
+
+    async def advance_mentions(self, pending_ids):
+        """Avanza el watermark por las notificaciones ya atendidas o que no eran menciones."""
+        if not self._mention_marks:
+            return
+        mark = contiguous_watermark(self._mention_marks, pending_ids, self.mentions_watermark)
+        if mark is not None and mark != self.mentions_watermark:
+            if await set_state(MENTIONS_WATERMARK_KEY, str(mark)):
+                self.mentions_watermark = mark
 
 # Instancia global para importar en otros lados
 x_bot = XClient()
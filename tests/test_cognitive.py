@@ -0,0 +1,352 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import src.modules.cognitive as cog
+from src.modules.model_router import LLM_MODEL_REASONER
+
+
+def make_response(content):
+    message = SimpleNamespace(content=content, reasoning_content=None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeStream:
+    """Imita AsyncStream de openai: itera deltas de a 4 caracteres y registra close()."""
+
+    def __init__(self, content, usage=None):
+        self.content = content
+        self.usage = usage
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for i in range(0, len(self.content), 4):
+            self.sent = i + 4
+            delta = SimpleNamespace(content=self.content[i:i + 4])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+        if self.usage:
+            # Como DeepSeek/OpenAI con include_usage: último chunk sin choices
+            yield SimpleNamespace(choices=[], usage=self.usage)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    def __init__(self, delay=0.0, content='{"tweet_content": "hola"}'):
+        self.delay = delay
+        self.content = content
+        self.active = 0
+        self.max_active = 0
+        self.last_stream = None
+
+    async def create(self, stream=False, **kwargs):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if stream:
+                self.last_stream = FakeStream(self.content)
+                return self.last_stream
+            return make_response(self.content)
+        finally:
+            self.active -= 1
+
+
+def make_engine(completions, concurrency=2):
+    engine = cog.CognitiveEngine()
+    engine.async_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    engine.max_concurrency = concurrency
+    engine.semaphore = asyncio.Semaphore(concurrency)
+    return engine
+
+
+@pytest.mark.asyncio
+async def test_async_generation_parses_json():
+    engine = make_engine(FakeCompletions())
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [])
+    assert decision == {"tweet_content": "hola"}
+
+
+@pytest.mark.asyncio
+async def test_async_generation_times_out():
+    engine = make_engine(FakeCompletions(delay=1.0))
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], timeout=0.05)
+    assert decision is None
+
+
+@pytest.mark.asyncio
+async def test_deadline_includes_waiting_for_the_semaphore():
+    engine = make_engine(FakeCompletions(delay=0.01), concurrency=1)
+    loop = asyncio.get_running_loop()
+    async with engine.semaphore:  # otro worker ocupa el único turno
+        started = loop.time()
+        decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], timeout=0.2, stream=False)
+        elapsed = loop.time() - started
+    assert decision is None
+    assert elapsed < 0.4
+
+
+@pytest.mark.asyncio
+async def test_repair_deadline_includes_waiting_for_the_semaphore():
+    engine = make_engine(FakeCompletions(content='{"tweet_content": "ok"}'), concurrency=1)
+    broken = {"error": "JSON_PARSE_FAILED", "raw": "{roto"}
+    loop = asyncio.get_running_loop()
+    async with engine.semaphore:
+        started = loop.time()
+        repaired = await engine._repair_decision(broken, timeout=0.2)
+        elapsed = loop.time() - started
+    assert repaired is broken
+    assert elapsed < 0.4
+
+
+@pytest.mark.asyncio
+async def test_semaphore_bounds_concurrency():
+    completions = FakeCompletions(delay=0.02)
+    engine = make_engine(completions, concurrency=2)
+    await asyncio.gather(*(engine.generate_bizarro_thought_async("t", "m", []) for _ in range(5)))
+    assert completions.max_active == 2
+
+
+@pytest.mark.asyncio
+async def test_streaming_generation_parses_json():
+    engine = make_engine(FakeCompletions())
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], stream=True)
+    assert decision == {"tweet_content": "hola"}
+    assert engine.async_client.chat.completions.last_stream.closed
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("content", [
+    '```json\n{"tweet_content": "hola"}\n```',
+    '{"tweet_content": "hola"}\nEspero que este tweet te sirva.',
+    'Aquí tienes la respuesta:\n```json\n{"tweet_content": "hola"}\n```',
+])
+async def test_streaming_parses_object_inside_fence_or_prose(content):
+    engine = make_engine(FakeCompletions(content=content))
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], stream=True)
+    assert decision == {"tweet_content": "hola"}
+
+
+@pytest.mark.asyncio
+async def test_streaming_not_json_abort_still_reaches_repair():
+    content = "Déjame pensarlo con calma. " * 20 + '{"tweet_content": "hola"}'
+    completions = FakeCompletions(content=content)
+    engine = make_engine(completions)
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], stream=True)
+    # El streaming se corta antes del objeto; la reparación (sin streaming) lo recupera
+    assert completions.last_stream.sent < len(content)
+    assert decision == {"tweet_content": "hola"}
+
+
+@pytest.mark.asyncio
+async def test_streaming_reads_usage_after_object_and_parses_the_slice():
+    usage = SimpleNamespace(prompt_tokens=100, prompt_cache_hit_tokens=80, prompt_cache_miss_tokens=20)
+    completions = FakeCompletions(content='```json\n{"tweet_content": "hola"}\n```\nListo.')
+    engine = make_engine(completions)
+    original_create = completions.create
+
+    async def create_with_usage(stream=False, **kwargs):
+        result = await original_create(stream=stream, **kwargs)
+        result.usage = usage
+        return result
+
+    completions.create = create_with_usage
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], stream=True)
+    assert decision == {"tweet_content": "hola"}
+    assert engine.last_usage["cache_hit_tokens"] == 80
+
+
+@pytest.mark.asyncio
+async def test_streaming_aborts_overlong_tweet_early():
+    content = '{"tweet_content": "' + "x" * 400 + '", "thought_process": "..."}'
+    completions = FakeCompletions(content=content)
+    engine = make_engine(completions)
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], stream=True)
+    assert decision is None
+    assert completions.last_stream.closed
+    assert completions.last_stream.sent < len(content)
+
+
+def test_system_message_is_static_across_calls():
+    engine = make_engine(FakeCompletions())
+    a = engine._build_messages("t1", "Eufórico", [SimpleNamespace(content="recuerdo")])
+    b = engine._build_messages("t2", "Depresivo", [])
+    assert a[0] == b[0]
+    assert "{mood_context}" not in a[0]["content"]
+    assert "Eufórico" in a[1]["content"] and "- recuerdo" in a[1]["content"]
+    assert a[1]["content"].endswith("Tweet entrante del Host: 't1'")
+
+
+def test_split_prompt_resolves_escaped_braces():
+    static, dynamic = cog.CognitiveEngine._split_system_prompt(
+        'Formato {{"a": 1}}\nMood: {mood_context}\n{rag_text}'
+    )
+    assert static == 'Formato {"a": 1}\n'
+    assert dynamic.startswith("Mood: {mood_context}")
+
+
+def test_usage_records_deepseek_cache_hits():
+    engine = make_engine(FakeCompletions())
+    usage = SimpleNamespace(prompt_tokens=1000, prompt_cache_hit_tokens=900, prompt_cache_miss_tokens=100)
+    engine._record_usage(usage)
+    engine._record_usage(usage)
+    assert engine.last_usage == {"prompt_tokens": 1000, "cache_hit_tokens": 900, "cache_miss_tokens": 100}
+    assert engine.usage_totals["cache_hit_tokens"] == 1800
+
+
+class ModelAwareCompletions(FakeCompletions):
+    """El modelo razonador tarda `slow_delay`; el resto responde al instante."""
+
+    def __init__(self, slow_model, slow_delay):
+        super().__init__()
+        self.slow_model = slow_model
+        self.slow_delay = slow_delay
+        self.models = []
+
+    async def create(self, stream=False, model=None, **kwargs):
+        self.models.append(model)
+        self.delay = self.slow_delay if model == self.slow_model else 0.0
+        return await super().create(stream=stream, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_reasoner_over_budget_falls_back_to_fast_model():
+    completions = ModelAwareCompletions(LLM_MODEL_REASONER, slow_delay=1.0)
+    engine = make_engine(completions)
+    engine.router.reasoner_budget = 0.05
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], timeout=2, stream=False)
+    assert decision == {"tweet_content": "hola"}
+    assert completions.models == [engine.model_reasoning, engine.model_chat]
+    assert engine.router.stats()[engine.model_reasoning]["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_route_skips_reasoner():
+    completions = ModelAwareCompletions(LLM_MODEL_REASONER, slow_delay=1.0)
+    engine = make_engine(completions)
+    await engine.generate_bizarro_thought_async("tweet", "Neutral", [], stream=False, action_type="MENTION")
+    assert completions.models == [engine.model_chat]
+
+
+class ScriptedCompletions:
+    """Cada llamada consume (delay, content) del guion y registra cancelaciones."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def create(self, stream=False, **kwargs):
+        delay, content = self.script[self.calls]
+        self.calls += 1
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return make_response(content)
+
+
+def test_is_valid_decision():
+    assert cog.is_valid_decision({"tweet_content": "hola"})
+    assert not cog.is_valid_decision({"tweet_content": "x" * 281})
+    assert not cog.is_valid_decision({"tweet_content": "  "})
+    assert not cog.is_valid_decision({"error": "JSON_PARSE_FAILED", "raw": "..."})
+    assert not cog.is_valid_decision(None)
+
+
+@pytest.mark.asyncio
+async def test_hedged_generation_returns_first_valid_and_cancels_rest(monkeypatch):
+    monkeypatch.setattr(cog, "LLM_REPAIR", False)
+    completions = ScriptedCompletions([
+        (1.0, '{"tweet_content": "lento"}'),
+        (0.01, "no es json"),
+        (0.02, '{"tweet_content": "rápido"}'),
+    ])
+    engine = make_engine(completions, concurrency=3)
+    decision = await engine.generate_bizarro_thought_async(
+        "tweet", "Neutral", [], stream=False, candidates=3, hedge_delay=0
+    )
+    assert decision == {"tweet_content": "rápido"}
+    assert completions.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_generation_launches_backup_after_delay(monkeypatch):
+    monkeypatch.setattr(cog, "LLM_REPAIR", False)
+    completions = ScriptedCompletions([
+        (1.0, '{"tweet_content": "lento"}'),
+        (0.0, '{"tweet_content": "respaldo"}'),
+    ])
+    engine = make_engine(completions, concurrency=2)
+    decision = await engine.generate_bizarro_thought_async(
+        "tweet", "Neutral", [], stream=False, candidates=2, hedge_delay=0.05
+    )
+    assert decision == {"tweet_content": "respaldo"}
+    assert completions.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_hedged_generation_returns_none_when_all_invalid(monkeypatch):
+    monkeypatch.setattr(cog, "LLM_REPAIR", False)
+    completions = ScriptedCompletions([(0.0, "nada"), (0.0, '{"tweet_content": ""}')])
+    engine = make_engine(completions)
+    decision = await engine.generate_bizarro_thought_async(
+        "tweet", "Neutral", [], stream=False, candidates=2, hedge_delay=10
+    )
+    assert decision is None
+    assert completions.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_invalid_output_is_repaired_with_one_cheap_call():
+    completions = ScriptedCompletions([
+        (0.0, '{"tweet_content": "' + "x" * 300 + '", "thought_process": "inversión"}'),
+        (0.0, '{"tweet_content": "corto", "thought_process": "inversión"}'),
+    ])
+    engine = make_engine(completions)
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], stream=False)
+    assert decision == {"tweet_content": "corto", "thought_process": "inversión"}
+    assert completions.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_recoverable_output_skips_repair_call():
+    completions = ScriptedCompletions([(0.0, 'Claro: {"tweet_content": "hola",} espero que sirva')])
+    engine = make_engine(completions)
+    decision = await engine.generate_bizarro_thought_async("tweet", "Neutral", [], stream=False)
+    assert decision == {"tweet_content": "hola"}
+    assert completions.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_hedged_candidates_are_clamped_to_concurrency(monkeypatch):
+    monkeypatch.setattr(cog, "LLM_REPAIR", False)
+    completions = ScriptedCompletions([(0.0, "nada"), (0.0, "nada"), (0.0, "nada")])
+    engine = make_engine(completions, concurrency=1)
+    decision = await engine.generate_bizarro_thought_async(
+        "tweet", "Neutral", [], stream=False, candidates=3, hedge_delay=0
+    )
+    assert decision is None
+    assert completions.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_hedge_has_a_single_overall_deadline(monkeypatch):
+    monkeypatch.setattr(cog, "LLM_REPAIR", False)
+    completions = ScriptedCompletions([(0.15, "nada"), (0.15, "nada"), (0.15, "nada")])
+    engine = make_engine(completions, concurrency=2)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    decision = await engine.generate_bizarro_thought_async(
+        "tweet", "Neutral", [], stream=False, timeout=0.25, candidates=2, hedge_delay=10
+    )
+    # Sin el plazo global el candidato relanzado tras el inválido alargaría la espera
+    assert decision is None
+    assert loop.time() - started < 0.35
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from src.modules.context_builder import ContextBuilder, NO_MEMORIES_TEXT, TRUNCATION_MARK
+
+
+def memory(content, distance=0.0):
+    return SimpleNamespace(content=content, distance=distance)
+
+
+def test_orders_memories_by_relevance():
+    builder = ContextBuilder(budget=1000, per_memory=100)
+    rag, included = builder.build_rag_text([memory("lejano", 0.9), memory("cercano", 0.1)], reserved_tokens=0)
+    assert rag.splitlines() == ["- cercano", "- lejano"]
+    assert included == 2
+
+
+def test_respects_budget_after_reserved_tokens():
+    builder = ContextBuilder(budget=100, per_memory=1000)
+    long_text = "palabra " * 200
+    rag, included = builder.build_rag_text([memory(long_text, 0.1), memory("corto", 0.2)], reserved_tokens=50)
+    assert rag == "- corto"
+    assert included == 1
+
+
+def test_truncates_long_memories():
+    builder = ContextBuilder(budget=1000, per_memory=10)
+    rag, _ = builder.build_rag_text([memory("uno dos tres " * 50)], reserved_tokens=0)
+    assert rag.endswith(TRUNCATION_MARK)
+    assert builder.count(rag) <= 10 + 5
+
+
+def test_empty_memories_placeholder():
+    builder = ContextBuilder(budget=1000)
+    assert builder.build_rag_text([], reserved_tokens=0) == (NO_MEMORIES_TEXT, 0)
@@ -0,0 +1,38 @@
+from src.modules.decision_schema import extract_json_object, parse_decision
+
+
+def test_extracts_fenced_json_with_trailing_text():
+    text = 'Aquí está:\n```json\n{"tweet_content": "hola", "new_valence_delta": -0.2}\n```\nSaludos'
+    assert extract_json_object(text) == {"tweet_content": "hola", "new_valence_delta": -0.2}
+
+
+def test_ignores_braces_inside_strings():
+    assert extract_json_object('{"tweet_content": "a } b"} y más {') == {"tweet_content": "a } b"}
+
+
+def test_repairs_single_quotes_and_trailing_commas():
+    assert extract_json_object("{'tweet_content': 'hola'}") == {"tweet_content": "hola"}
+    assert extract_json_object('{"tweet_content": "hola", }') == {"tweet_content": "hola"}
+
+
+def test_truncated_object_drops_incomplete_field():
+    text = '{"tweet_content": "hola", "thought_process": "una inversión que se cor'
+    assert extract_json_object(text) == {"tweet_content": "hola"}
+
+
+def test_truncated_tweet_is_never_closed():
+    assert extract_json_object('{"thought_process": "x", "tweet_content": "hol') == {"thought_process": "x"}
+    decision, error = parse_decision('{"thought_process": "x", "tweet_content": "hol')
+    assert decision is None and error.startswith("SCHEMA_INVALID")
+
+
+def test_schema_rejects_long_tweet_and_coerces_numbers():
+    decision, error = parse_decision('{"tweet_content": "' + "x" * 281 + '"}')
+    assert decision is None and "tweet_content" in error
+    decision, error = parse_decision('{"tweet_content": " hola ", "new_arousal_delta": "0.3"}')
+    assert error is None
+    assert decision.tweet_content == "hola" and decision.new_arousal_delta == 0.3
+
+
+def test_not_json():
+    assert parse_decision("lo siento, no puedo") == (None, "JSON_PARSE_FAILED")
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from src.modules.embedding_batcher import EmbeddingBatcher, iter_batches
+
+
+class FakeEmbedder:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_coalesce_into_one_request():
+    embedder = FakeEmbedder()
+    batcher = EmbeddingBatcher(embedder, window=0.01)
+    results = await asyncio.gather(*(batcher.embed(t) for t in ["a", "bb", "ccc"]))
+    assert results == [[1.0], [2.0], [3.0]]
+    assert embedder.calls == [["a", "bb", "ccc"]]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_texts_sent_once():
+    embedder = FakeEmbedder()
+    batcher = EmbeddingBatcher(embedder, window=0.01)
+    results = await asyncio.gather(batcher.embed("x"), batcher.embed("x"))
+    assert results == [[1.0], [1.0]]
+    assert embedder.calls == [["x"]]
+
+
+@pytest.mark.asyncio
+async def test_max_batch_size_flushes_immediately():
+    embedder = FakeEmbedder()
+    batcher = EmbeddingBatcher(embedder, window=10, max_batch_size=2)
+    results = await asyncio.wait_for(
+        asyncio.gather(batcher.embed("a"), batcher.embed("b")), timeout=1
+    )
+    assert len(results) == 2
+    assert embedder.calls == [["a", "b"]]
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_all_waiters():
+    async def failing(texts):
+        raise RuntimeError("boom")
+
+    batcher = EmbeddingBatcher(failing, window=0.01)
+    results = await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_iter_batches_respects_size_and_tokens():
+    texts = ["a" * 40] * 5  # ~11 tokens cada uno
+    batches = list(iter_batches(texts, max_size=2, max_tokens=1000))
+    assert [offset for offset, _ in batches] == [0, 2, 4]
+    batches = list(iter_batches(texts, max_size=10, max_tokens=25))
+    assert [len(b) for _, b in batches] == [2, 2, 1]
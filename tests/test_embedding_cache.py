@@ -0,0 +1,49 @@
+import pytest
+
+from src.modules.embedding_cache import EmbeddingCache, text_hash
+
+
+def test_hash_ignores_whitespace_differences():
+    assert text_hash("hola  mundo\n") == text_hash("hola mundo")
+
+
+@pytest.mark.asyncio
+async def test_memory_tier_hits_and_misses():
+    cache = EmbeddingCache(max_entries=10, persist=False)
+    await cache.put_many({"a": [1.0]}, "m")
+    found = await cache.get_many(["a", "b"], "m")
+    assert found == {"a": [1.0]}
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_model_is_part_of_the_key():
+    cache = EmbeddingCache(max_entries=10, persist=False)
+    await cache.put_many({"a": [1.0]}, "m1")
+    assert cache.get_memory("a", "m2") is None
+    assert cache.get_memory("a", "m1") == [1.0]
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_least_recently_used():
+    cache = EmbeddingCache(max_entries=2, persist=False)
+    await cache.put_many({"a": [1.0], "b": [2.0]}, "m")
+    cache.get_memory("a", "m")  # "b" pasa a ser el menos reciente
+    await cache.put_many({"c": [3.0]}, "m")
+    assert cache.get_memory("b", "m") is None
+    assert cache.get_memory("a", "m") == [1.0]
+
+
+@pytest.mark.asyncio
+async def test_persistent_tier_promotes_to_memory(monkeypatch):
+    cache = EmbeddingCache(max_entries=10, persist=True)
+
+    async def fake_load(hashes, model):
+        return {h: [9.0] for h in hashes if h == text_hash("x")}
+
+    monkeypatch.setattr(cache, "_load_persistent", fake_load)
+    found = await cache.get_many(["x"], "m")
+    assert found == {"x": [9.0]}
+    assert cache.stats()["persistent_hits"] == 1
+    assert cache.get_memory("x", "m") == [9.0]
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import pytest
+
+import src.modules.host_feed as hf
+
+
+def tweets(*ids):
+    return [SimpleNamespace(id=str(i), text=f"tweet {i}") for i in ids]
+
+
+def make_feed(first_page, watermark):
+    queries = []
+
+    async def search_tweet(query, product, count):
+        queries.append(query)
+        return first_page
+
+    feed = hf.HostTimelineFeed(SimpleNamespace(client=SimpleNamespace(search_tweet=search_tweet)), "host")
+    feed.watermark = watermark
+    feed._loaded = True
+    return feed, queries
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    saved = {}
+
+    async def set_state(key, value):
+        saved[key] = value
+        return True
+
+    monkeypatch.setattr(hf, "set_state", set_state)
+    return saved
+
+
+@pytest.mark.asyncio
+async def test_fetch_pages_until_watermark(stored, fake_page):
+    page2 = fake_page(tweets(103, 102, 100))
+    page1 = fake_page(tweets(106, 105, 104), next_page=page2)
+    feed, queries = make_feed(page1, watermark=101)
+
+    new = await feed.fetch_new()
+
+    assert queries == ["from:host since_id:101"]
+    assert [t.id for t in new] == ["102", "103", "104", "105", "106"]
+
+
+@pytest.mark.asyncio
+async def test_bootstrap_takes_only_latest(stored, fake_page):
+    feed, queries = make_feed(fake_page(tweets(9, 8, 7), next_page=fake_page(tweets(6))), watermark=None)
+    new = await feed.fetch_new()
+    assert queries == ["from:host"]
+    assert [t.id for t in new] == ["9"]
+    assert feed.watermark == 8
+
+
+@pytest.mark.asyncio
+async def test_advance_stops_at_first_pending(stored, fake_page):
+    feed, _ = make_feed(fake_page([]), watermark=100)
+    await feed.advance(tweets(101, 102, 103), pending_ids=["102"])
+    assert feed.watermark == 101
+    assert stored[hf.HOST_WATERMARK_KEY] == "101"
+
+    await feed.advance(tweets(102, 103), pending_ids=[])
+    assert feed.watermark == 103
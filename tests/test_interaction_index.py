@@ -0,0 +1,43 @@
+import pytest
+
+from src.modules.interaction_index import HandledTweetIndex
+
+
+class RecordingIndex(HandledTweetIndex):
+    """Sustituye la consulta a Postgres por un conjunto en memoria."""
+
+    def __init__(self, db_ids):
+        super().__init__()
+        self.db_ids = set(db_ids)
+        self.queries = []
+
+    async def _fetch_handled(self, tweet_ids):
+        self.queries.append(set(tweet_ids))
+        return self.db_ids & tweet_ids
+
+
+@pytest.mark.asyncio
+async def test_handled_among_single_query_for_unknown_ids():
+    idx = RecordingIndex(db_ids={"2"})
+    idx.mark_handled("1")
+    handled = await idx.handled_among(["1", "2", "3", None])
+    assert handled == {"1", "2"}
+    assert idx.queries == [{"2", "3"}]
+
+
+@pytest.mark.asyncio
+async def test_handled_among_no_query_when_all_known():
+    idx = RecordingIndex(db_ids=set())
+    idx.mark_handled("1")
+    idx.mark_handled("2")
+    assert await idx.handled_among(["1", "2"]) == {"1", "2"}
+    assert idx.queries == []
+
+
+@pytest.mark.asyncio
+async def test_db_hits_are_cached():
+    idx = RecordingIndex(db_ids={"9"})
+    await idx.handled_among(["9"])
+    await idx.handled_among(["9"])
+    assert idx.queries == [{"9"}]
+    assert "9" in idx
@@ -0,0 +1,65 @@
+import json
+
+from src.modules.json_stream import DecisionStreamParser
+
+
+def feed_in_chunks(parser, text, size=3):
+    for i in range(0, len(text), size):
+        parser.feed(text[i:i + size])
+        if parser.error or parser.complete:
+            break
+    return parser
+
+
+def test_tweet_content_available_before_object_closes():
+    payload = '{"tweet_content": "El orden es \\"caos\\" dormido", "thought_process": "inversión'
+    parser = feed_in_chunks(DecisionStreamParser(), payload)
+    assert parser.tweet_content == 'El orden es "caos" dormido'
+    assert parser.complete is False
+    assert parser.error is None
+
+
+def test_complete_object_with_markdown_fence():
+    decision = {"thought_process": "x", "tweet_content": "hola\nmundo", "new_valence_delta": -0.1}
+    payload = "```json\n" + json.dumps(decision) + "\n```"
+    parser = feed_in_chunks(DecisionStreamParser(), payload)
+    assert parser.complete is True
+    assert parser.tweet_content == "hola\nmundo"
+    assert json.loads(parser.object_text) == decision
+
+
+def test_object_text_excludes_trailing_prose():
+    payload = '{"tweet_content": "a {b}"} Espero que te sirva, tr'
+    parser = feed_in_chunks(DecisionStreamParser(), payload, size=7)
+    assert parser.complete is True
+    assert parser.object_text == '{"tweet_content": "a {b}"}'
+
+
+def test_nested_keys_are_not_captured():
+    payload = '{"meta": {"tweet_content": "no"}, "tweet_content": "sí"}'
+    parser = feed_in_chunks(DecisionStreamParser(), payload)
+    assert parser.tweet_content == "sí"
+
+
+def test_aborts_when_tweet_exceeds_limit():
+    payload = '{"tweet_content": "' + "a" * 50 + '"}'
+    parser = feed_in_chunks(DecisionStreamParser(max_tweet_chars=20), payload)
+    assert parser.error == "too_long"
+    assert len(parser.text) < len(payload)
+
+
+def test_prose_preamble_before_object_is_tolerated():
+    payload = 'Aquí tienes la respuesta:\n```json\n{"tweet_content": "hola"}\n```'
+    parser = feed_in_chunks(DecisionStreamParser(), payload)
+    assert parser.error is None and parser.complete is True
+    assert parser.object_text == '{"tweet_content": "hola"}'
+
+
+def test_aborts_on_prose_without_json():
+    parser = feed_in_chunks(DecisionStreamParser(), "Lo siento, no puedo ayudar con eso. " * 20)
+    assert parser.error == "not_json"
+
+
+def test_unicode_escapes_are_decoded():
+    parser = feed_in_chunks(DecisionStreamParser(), '{"tweet_content": "ni\\u00f1o"}', size=1)
+    assert parser.tweet_content == "niño"
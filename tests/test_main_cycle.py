@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+
+
+@pytest.mark.asyncio
+async def test_run_stage_returns_default_on_timeout_and_error():
+    async def slow():
+        await asyncio.sleep(1)
+        return "tarde"
+
+    async def broken():
+        raise RuntimeError("boom")
+
+    assert await main.run_stage("lenta", slow(), "default", timeout=0.01) == "default"
+    assert await main.run_stage("rota", broken(), []) == []
+
+
+@pytest.mark.asyncio
+async def test_perception_stages_run_concurrently(monkeypatch):
+    delay = 0.1
+
+    async def slow(value):
+        await asyncio.sleep(delay)
+        return value
+
+    monkeypatch.setattr(main.host_feed, "fetch_new", lambda: slow([]))
+    monkeypatch.setattr(main.host_feed, "advance", lambda tweets, pending_ids: asyncio.sleep(0))
+    monkeypatch.setattr(main.x_bot, "get_new_mentions", lambda: slow([]))
+    monkeypatch.setattr(main.x_bot, "advance_mentions", lambda pending_ids: asyncio.sleep(0))
+    monkeypatch.setattr(main, "last_daily_post_date", lambda: slow(main.datetime.now(main.timezone.utc).date()))
+    monkeypatch.setattr(main.mood_engine, "get_current_mood", lambda: slow(main.NEUTRAL_MOOD))
+    monkeypatch.setattr(main.handled_index, "handled_among", lambda ids: slow(set()))
+    # Precarga fallida al arrancar: el ciclo la reintenta en paralelo con la percepción
+    monkeypatch.setattr(main.handled_index, "warmed", False)
+    warmed = []
+    monkeypatch.setattr(main.handled_index, "warm", lambda: slow(warmed.append(True)))
+    decided = {}
+    monkeypatch.setattr(
+        main.state_machine, "plan_actions",
+        lambda **kwargs: decided.update(kwargs) or [],
+    )
+
+    started = time.monotonic()
+    await main.run_autonomy_cycle()
+    elapsed = time.monotonic() - started
+
+    # Cuatro etapas en paralelo + verificación en lote, no cinco esperas seguidas
+    assert elapsed < delay * 3
+    assert decided["allow_daily"] is False
+    assert decided["host_tweets"] == [] and decided["mentions"] == []
+    assert warmed == [True]
+
+
+@pytest.mark.asyncio
+async def test_cycle_drains_queue_within_budget(monkeypatch):
+    mentions = [{"id": f"m{i}", "text": "una mención suficientemente larga para no ser ignorada"} for i in range(5)]
+
+    async def value(v):
+        return v
+
+    monkeypatch.setattr(main.host_feed, "fetch_new", lambda: value([]))
+    monkeypatch.setattr(main.host_feed, "advance", lambda tweets, pending_ids: value(None))
+    monkeypatch.setattr(main.x_bot, "get_new_mentions", lambda: value(mentions))
+    advanced = {}
+    monkeypatch.setattr(main.x_bot, "advance_mentions", lambda pending_ids: value(advanced.update(pending=pending_ids)))
+    monkeypatch.setattr(main, "last_daily_post_date", lambda: value(main.datetime.now(main.timezone.utc).date()))
+    monkeypatch.setattr(main.mood_engine, "get_current_mood", lambda: value(main.NEUTRAL_MOOD))
+    monkeypatch.setattr(main.handled_index, "handled_among", lambda ids: value({"m0"}))
+    monkeypatch.setattr(main.memory_service, "get_embeddings", lambda texts: value([]))
+    monkeypatch.setattr(main, "ACTIONS_PER_CYCLE", 3)
+    executed = []
+
+    monkeypatch.setattr(main.handled_index, "_handled", set())
+    monkeypatch.setattr(main.handled_index, "warmed", True)
+
+    async def fake_execute(plan, mood):
+        executed.append(plan.target_tweet.id)
+        main.handled_index.mark_handled(plan.target_tweet.id)
+        return True
+
+    monkeypatch.setattr(main, "execute_plan", fake_execute)
+    await main.run_autonomy_cycle()
+    assert executed == ["m1", "m2", "m3"]
+    # m4 quedó fuera del presupuesto: el watermark de notificaciones no debe pasarla
+    assert advanced["pending"] == {"m4"}
+
+
+@pytest.mark.asyncio
+async def test_stop_background_cancels_and_awaits_every_task():
+    finished = []
+
+    async def loop_forever(name):
+        try:
+            await asyncio.sleep(10)
+        finally:
+            finished.append(name)
+
+    tasks = [asyncio.create_task(loop_forever(n)) for n in ("replica", "outbox", "mood", "rollup")]
+    await asyncio.sleep(0)
+    await main.stop_background(tasks)
+    assert sorted(finished) == ["mood", "outbox", "replica", "rollup"]
+    assert all(t.done() for t in tasks)
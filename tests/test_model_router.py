@@ -0,0 +1,28 @@
+import pytest
+
+from src.modules.model_router import ModelRouter, parse_routes
+
+
+def test_parse_routes():
+    assert parse_routes("host=reasoner, Mention=FAST") == {"host": "reasoner", "mention": "fast"}
+    with pytest.raises(ValueError):
+        parse_routes("host=turbo")
+
+
+def test_choose_defaults_to_reasoner():
+    router = ModelRouter("r1", "v3", "mention=fast")
+    assert router.choose("MENTION") == "v3"
+    assert router.choose("HOST") == "r1"
+    assert router.choose(None) == "r1"
+
+
+def test_latency_stats():
+    router = ModelRouter("r1", "v3", "")
+    for seconds in (1, 2, 3, 4, 100):
+        router.record("r1", seconds)
+    router.record("r1", 60, timed_out=True)
+    stats = router.stats()["r1"]
+    assert stats["count"] == 6
+    assert stats["p50"] in (3, 4)
+    assert stats["p95"] == 100
+    assert stats["timeouts"] == 1
@@ -0,0 +1,77 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import src.modules.mood_engine as mood_module
+from src.modules.mood_engine import MoodEngine
+
+
+def make_engine(valence=0.0, arousal=0.0, at=1000.0, half_life=3600):
+    engine = MoodEngine(half_life=half_life)
+    engine.valence, engine.arousal, engine.updated_at = valence, arousal, at
+    engine._loaded = True
+    return engine
+
+
+def test_decay_depends_on_elapsed_time_not_reads():
+    engine = make_engine(valence=0.8, arousal=-0.4)
+    for _ in range(10):
+        assert engine.current(now=1000.0)["valence"] == 0.8
+    mood = engine.current(now=1000.0 + 3600)
+    assert mood["valence"] == 0.4 and mood["arousal"] == -0.2
+    assert engine.current(now=1000.0 + 7200)["valence"] == 0.2
+
+
+def test_apply_starts_from_decayed_mood_and_clamps():
+    engine = make_engine(valence=0.8, arousal=0.8)
+    mood = engine.apply(0.1, 0.9, stimulus_type="tweet_posted", now=1000.0 + 3600)
+    assert mood["valence"] == 0.5 and mood["arousal"] == 1.0
+    assert engine.updated_at == 1000.0 + 3600
+    assert [(m.valence, m.arousal) for m in engine._pending] == [(0.5, 1.0)]
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batch_and_keeps_it_on_failure(fake_db):
+    engine = make_engine()
+    engine.apply(0.2, 0.0, stimulus_type="a", now=1000.0)
+    engine.apply(0.2, 0.0, stimulus_type="b", now=1001.0)
+    session = fake_db(mood_module)
+    session.fail_commit = True
+
+    assert await engine.flush() == 0
+    assert [m.stimulus_type for m in engine._pending] == ["a", "b"]
+
+    session.fail_commit = False
+    session.added.clear()
+    assert await engine.flush() == 2
+    assert [m.stimulus_type for m in session.added] == ["a", "b"]
+    assert engine._pending == []
+    assert await engine.flush() == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_flush_puts_the_batch_back(fake_db):
+    engine = make_engine()
+    engine.apply(0.2, 0.0, stimulus_type="a", now=1000.0)
+    session = fake_db(mood_module)
+
+    async def hanging_commit():
+        await asyncio.sleep(10)
+
+    session.commit = hanging_commit
+    task = asyncio.create_task(engine.flush())
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert [m.stimulus_type for m in engine._pending] == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_load_after_apply_does_not_overwrite_newer_state(fake_db):
+    engine = MoodEngine(half_life=3600)  # la carga inicial falló: _loaded sigue en False
+    engine.apply(0.5, 0.0, stimulus_type="tweet_posted", now=2000.0)
+    fake_db(mood_module, scalar=SimpleNamespace(valence=-0.9, arousal=-0.9, created_at=None))
+
+    await engine.load()
+    assert engine.valence == 0.5 and engine.updated_at == 2000.0
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from src.core.mood_rollup import bucket_start, build_rollups, upsert_statements
+
+
+def test_bucket_start_truncates_in_utc():
+    ts = datetime(2024, 5, 3, 23, 47, 12, tzinfo=timezone(timedelta(hours=-3)))
+    assert bucket_start(ts, "hour") == datetime(2024, 5, 4, 2, tzinfo=timezone.utc)
+    assert bucket_start(ts, "day") == datetime(2024, 5, 4, tzinfo=timezone.utc)
+    assert bucket_start(datetime(2024, 5, 3, 10, 5), "hour") == datetime(2024, 5, 3, 10, tzinfo=timezone.utc)
+
+
+def test_build_rollups_merges_stimulus_counts_per_bucket():
+    h10, h11 = datetime(2024, 5, 3, 10), datetime(2024, 5, 3, 11)
+    stats = [
+        (h10, 3, 0.1234567, -0.5, 0.6, 0.2, 0.0, 0.4),
+        (h11, 1, -0.2, -0.2, -0.2, 0.9, 0.9, 0.9),
+    ]
+    stimulus = [(h10, "tweet_posted", 2), (h10, None, 1), (h11, "tweet_posted", 1)]
+    rows = build_rollups("hour", stats, stimulus)
+
+    assert [r["bucket_start"] for r in rows] == [h10.replace(tzinfo=timezone.utc), h11.replace(tzinfo=timezone.utc)]
+    assert rows[0]["samples"] == 3 and rows[0]["valence_avg"] == 0.1235
+    assert (rows[0]["valence_min"], rows[0]["valence_max"]) == (-0.5, 0.6)
+    assert rows[0]["stimulus_counts"] == {"tweet_posted": 2, "unknown": 1}
+    assert rows[1]["stimulus_counts"] == {"tweet_posted": 1}
+    assert all(r["period"] == "hour" for r in rows)
+
+
+def test_upsert_is_chunked_below_the_bind_parameter_limit():
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    stats = [(start + timedelta(hours=h), 1, 0.1, 0.1, 0.1, 0.2, 0.2, 0.2) for h in range(3360)]
+    rows = build_rollups("hour", stats, [])
+
+    statements = list(upsert_statements(rows, chunk_size=1000))
+    assert len(statements) == 4
+    params = [len(stmt.compile(dialect=postgresql.dialect()).params) for stmt in statements]
+    assert sum(params) == 3360 * 10
+    assert max(params) <= 32767
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import src.modules.outbox as outbox
+
+
+def make_worker(fake_db, task, handler):
+    session = fake_db(outbox, scalar=task)
+    return outbox.OutboxWorker({"save_memory": handler}), session
+
+
+def pending_task(attempts=0):
+    return SimpleNamespace(id=1, task_type="save_memory", payload={"content": "x"}, status="pending",
+                           attempts=attempts, last_error=None, next_attempt_at=None)
+
+
+def test_backoff_grows_and_is_capped():
+    assert outbox.backoff_for(1) == timedelta(seconds=outbox.OUTBOX_BACKOFF_BASE)
+    assert outbox.backoff_for(2) == timedelta(seconds=outbox.OUTBOX_BACKOFF_BASE * 2)
+    assert outbox.backoff_for(50) == timedelta(seconds=outbox.OUTBOX_BACKOFF_MAX)
+
+
+@pytest.mark.asyncio
+async def test_handler_runs_outside_any_transaction(fake_db):
+    seen = {}
+
+    async def handler(task_id, payload):
+        seen["open"] = session.open
+        seen["leased_until"] = task.next_attempt_at
+        return True
+
+    task = pending_task()
+    worker, session = make_worker(fake_db, task, handler)
+    assert await worker._process(1) is True
+    # Reclamada y arrendada en una transacción ya confirmada; resultado en otra
+    assert seen["open"] is False
+    assert seen["leased_until"] > datetime.now(timezone.utc)
+    assert (task.status, task.attempts, session.commits) == ("done", 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_failure_is_rescheduled_then_failed(fake_db):
+    async def handler(task_id, payload):
+        raise RuntimeError("API caída")
+
+    task = pending_task()
+    worker, _ = make_worker(fake_db, task, handler)
+    assert await worker._process(1) is False
+    assert task.status == "pending" and task.attempts == 1
+    assert "API caída" in task.last_error
+
+    task.attempts = outbox.OUTBOX_MAX_ATTEMPTS - 1
+    await worker._process(1)
+    assert task.status == "failed"
+
+
+@pytest.mark.asyncio
+async def test_task_locked_elsewhere_is_skipped(fake_db):
+    async def handler(task_id, payload):
+        raise AssertionError("no debe ejecutarse")
+
+    worker, session = make_worker(fake_db, None, handler)
+    assert await worker._process(1) is None
+    assert session.commits == 0
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+
+import src.modules.scheduler as sched
+from src.modules.scheduler import AdaptivePollScheduler
+
+NOON = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+
+
+def make_scheduler():
+    return AdaptivePollScheduler(min_interval=60, max_interval=900, half_life=1800, lookback_days=1)
+
+
+def test_quiet_period_uses_long_intervals():
+    scheduler = make_scheduler()
+    for _ in range(20):
+        interval = scheduler.next_interval(NOON)
+        assert 900 * (1 - sched.SCHEDULER_JITTER) <= interval <= 900
+
+
+def test_first_observation_only_sets_reference():
+    scheduler = make_scheduler()
+    assert scheduler.observe(["a", "b", "c"], now=NOON) == 0
+    assert scheduler.rate == 0.0
+    assert scheduler.observe(["a", "b", "c", "d"], now=NOON + 300) == 1
+    assert scheduler.rate > 0
+
+
+def test_burst_shortens_interval_within_bounds():
+    scheduler = make_scheduler()
+    scheduler.observe([], now=NOON)
+    for step in range(1, 6):
+        scheduler.observe([f"m{step}-{i}" for i in range(5)], now=NOON + step * 120)
+    interval = scheduler.next_interval(NOON + 600)
+    assert 60 <= interval < 300
+
+
+def test_hourly_profile_drives_rate_for_that_hour():
+    scheduler = make_scheduler()
+    busy_hour = [datetime(2024, 1, 1, 12, m, tzinfo=timezone.utc) for m in range(0, 60, 5)]
+    scheduler.load_profile(busy_hour, now=NOON)
+    assert scheduler.expected_rate(NOON) == 12 / 3600
+    assert scheduler.expected_rate(NOON + 6 * 3600) == 0.0
+    assert scheduler.next_interval(NOON) <= 300 * (1 + sched.SCHEDULER_JITTER)
+    assert not scheduler.profile_stale(NOON + 60)
@@ -0,0 +1,26 @@
+from types import SimpleNamespace
+
+from src.modules.tweet_record import TweetRecord
+
+
+def test_from_twikit_like_object():
+    user = SimpleNamespace(id=42, screen_name="host")
+    tweet = SimpleNamespace(id=7, text="hola", user=user, favorite_count="3", retweet_count=None,
+                            repost_count=1, media=["img"], in_reply_to="5")
+    record = TweetRecord.from_raw(tweet)
+    assert (record.id, record.text, record.author_id, record.author_name) == ("7", "hola", "42", "host")
+    assert (record.like_count, record.retweet_count, record.has_media, record.in_reply_to) == (3, 1, True, "5")
+
+
+def test_from_dict_and_nested_notification():
+    assert TweetRecord.from_raw({"tweet_id": 9, "text": "x", "like_count": 2}).id == "9"
+    notification = SimpleNamespace(tweet=SimpleNamespace(id="11", text="mención"))
+    assert TweetRecord.from_raw(notification).id == "11"
+    assert TweetRecord.from_raw({"status": {"id": "12"}}).id == "12"
+
+
+def test_coerce_is_idempotent_and_slotted():
+    record = TweetRecord.coerce({"id": "1", "text": "t"})
+    assert TweetRecord.coerce(record) is record
+    assert TweetRecord.coerce(None) is None
+    assert not hasattr(record, "__dict__")
@@ -0,0 +1,57 @@
+import src.core.vector_index as vi
+
+
+def test_ivfflat_lists_rule_of_thumb(monkeypatch):
+    monkeypatch.setattr(vi, "IVFFLAT_LISTS", 0)
+    assert vi.ivfflat_lists_for(500) == 1
+    assert vi.ivfflat_lists_for(200_000) == 200
+    assert vi.ivfflat_lists_for(4_000_000) == 2000
+
+
+def test_hnsw_ddl_and_search_settings(monkeypatch):
+    monkeypatch.setattr(vi, "MEMORY_INDEX_METHOD", "hnsw")
+    monkeypatch.setattr(vi, "HNSW_EF_SEARCH", 80)
+    ddl = vi.index_ddl(concurrently=True)
+    assert "CREATE INDEX CONCURRENTLY IF NOT EXISTS" in ddl
+    assert "USING hnsw (embedding vector_cosine_ops)" in ddl
+    assert vi.search_settings() == ["SET LOCAL hnsw.ef_search = 80"]
+
+
+def test_ivfflat_ddl_and_search_settings(monkeypatch):
+    monkeypatch.setattr(vi, "MEMORY_INDEX_METHOD", "ivfflat")
+    monkeypatch.setattr(vi, "IVFFLAT_LISTS", 0)
+    monkeypatch.setattr(vi, "IVFFLAT_PROBES", 7)
+    assert "WITH (lists = 50)" in vi.index_ddl(row_count=50_000)
+    assert vi.search_settings() == ["SET LOCAL ivfflat.probes = 7"]
+
+
+def test_compact_embedding_truncates_and_normalizes():
+    compact = vi.compact_embedding([3.0, 4.0, 12.0], dims=2)
+    assert compact == [0.6, 0.8]
+    assert vi.compact_embedding([0.0, 0.0, 1.0], dims=2) == [0.0, 0.0]
+
+
+def test_index_target_per_storage_mode(monkeypatch):
+    monkeypatch.setattr(vi, "MEMORY_COMPACT_DIMENSIONS", 256)
+    monkeypatch.setattr(vi, "MEMORY_STORAGE_MODE", "halfvec")
+    assert vi.index_target() == "embedding_compact halfvec_cosine_ops"
+    monkeypatch.setattr(vi, "MEMORY_STORAGE_MODE", "binary")
+    assert vi.index_target() == "(binary_quantize(embedding_compact)::bit(256)) bit_hamming_ops"
+
+
+def test_ef_search_covers_rerank_candidates(monkeypatch):
+    monkeypatch.setattr(vi, "MEMORY_INDEX_METHOD", "hnsw")
+    monkeypatch.setattr(vi, "MEMORY_STORAGE_MODE", "halfvec")
+    monkeypatch.setattr(vi, "HNSW_EF_SEARCH", 40)
+    monkeypatch.setattr(vi, "MEMORY_RERANK_CANDIDATES", 100)
+    assert vi.search_settings() == ["SET LOCAL hnsw.ef_search = 100"]
+
+
+def test_iterative_scan_only_for_filtered_queries(monkeypatch):
+    monkeypatch.setattr(vi, "MEMORY_INDEX_METHOD", "hnsw")
+    monkeypatch.setattr(vi, "MEMORY_STORAGE_MODE", "full")
+    monkeypatch.setattr(vi, "MEMORY_ITERATIVE_SCAN", "relaxed_order")
+    assert len(vi.search_settings()) == 1
+    assert vi.search_settings(filtered=True)[-1] == "SET LOCAL hnsw.iterative_scan = relaxed_order"
+    monkeypatch.setattr(vi, "MEMORY_ITERATIVE_SCAN", "off")
+    assert len(vi.search_settings(filtered=True)) == 1
@@ -0,0 +1,104 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.modules.vector_replica import LocalVectorReplica
+
+
+def row(id_, content, embedding):
+    return SimpleNamespace(
+        id=id_,
+        content=content,
+        source_type="host_tweet",
+        created_at=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        embedding=embedding,
+    )
+
+
+def test_search_returns_most_similar_first(tmp_path):
+    replica = LocalVectorReplica(tmp_path)
+    replica.load()
+    replica._append([
+        row(1, "norte", [1.0, 0.0, 0.0]),
+        row(2, "este", [0.0, 1.0, 0.0]),
+        row(3, "noreste", [0.7, 0.7, 0.0]),
+    ])
+    results = replica.search([1.0, 0.1, 0.0], limit=2)
+    assert [m.content for m in results] == ["norte", "noreste"]
+
+
+def test_reload_from_disk_and_skip_duplicates(tmp_path):
+    replica = LocalVectorReplica(tmp_path)
+    replica.load()
+    replica._append([row(1, "a", [1.0, 0.0]), row(2, "b", [0.0, 1.0])])
+
+    reloaded = LocalVectorReplica(tmp_path)
+    reloaded.load()
+    assert len(reloaded) == 2
+    assert reloaded.last_id == 2
+    reloaded._append([row(2, "b", [0.0, 1.0]), row(3, "c", [1.0, 1.0])])
+    assert len(reloaded) == 3
+
+
+def test_truncated_files_are_repaired_on_load(tmp_path):
+    replica = LocalVectorReplica(tmp_path)
+    replica.load()
+    replica._append([row(1, "a", [1.0, 0.0]), row(2, "b", [0.0, 1.0])])
+    # Simula un crash a mitad de escritura: falta la última fila de embeddings
+    emb_path = tmp_path / "embeddings.f32"
+    with emb_path.open("r+b") as f:
+        f.truncate(2 * 4)
+
+    reloaded = LocalVectorReplica(tmp_path)
+    reloaded.load()
+    assert len(reloaded) == 1
+    assert reloaded.last_id == 1
+
+
+def test_not_fresh_until_synced(tmp_path):
+    replica = LocalVectorReplica(tmp_path)
+    replica.load()
+    assert replica.is_fresh() is False
+
+
+def test_filter_columns_grow_only_with_new_rows(tmp_path, monkeypatch):
+    replica = LocalVectorReplica(tmp_path)
+    replica.load()
+    parsed = []
+    original = LocalVectorReplica._filter_columns
+    monkeypatch.setattr(LocalVectorReplica, "_filter_columns",
+                        staticmethod(lambda entries: parsed.append(len(entries)) or original(entries)))
+
+    replica._append([row(1, "a", [1.0, 0.0]), row(2, "b", [0.0, 1.0])])
+    replica._append([row(3, "c", [1.0, 1.0])])
+
+    assert parsed == [2, 1]
+    assert list(replica._source_types) == ["host_tweet"] * 3
+    assert len(replica._created_ts) == len(replica) == 3
+
+
+def test_search_applies_source_and_similarity_filters(tmp_path):
+    replica = LocalVectorReplica(tmp_path)
+    replica.load()
+    reflection = row(2, "reflexión", [1.0, 0.0])
+    reflection.source_type = "self_reflection"
+    replica._append([row(1, "host", [0.6, 0.8]), reflection, row(3, "lejano", [0.0, 1.0])])
+
+    results = replica.search([1.0, 0.0], limit=3, source_types=["host_tweet"])
+    assert [m.content for m in results] == ["host", "lejano"]
+
+    results = replica.search([1.0, 0.0], limit=3, source_types=["host_tweet"], min_similarity=0.5)
+    assert [m.content for m in results] == ["host"]
+
+
+def test_search_returns_slim_hits_with_distance(tmp_path):
+    replica = LocalVectorReplica(tmp_path)
+    replica.load()
+    replica._append([row(1, "a", [1.0, 0.0])])
+    (hit,) = replica.search([1.0, 0.0], limit=1)
+    assert hit.id == 1
+    assert hit.source_type == "host_tweet"
+    assert hit.distance == pytest.approx(0.0, abs=1e-6)
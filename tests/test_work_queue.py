@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from src.modules.state_machine import ActionPlan, InteractionStateMachine
+from src.modules.work_queue import ActionQueue, drain
+
+LONG_TEXT = "un texto suficientemente largo como para no ser descartado"
+
+
+def test_plan_actions_scores_all_candidates():
+    sm = InteractionStateMachine()
+    host = SimpleNamespace(id="h", text=LONG_TEXT)
+    quiet = SimpleNamespace(id="m1", text=LONG_TEXT, favorite_count=0)
+    popular = SimpleNamespace(id="m2", text=LONG_TEXT, favorite_count=10)
+    short = SimpleNamespace(id="m3", text="corto")
+    now = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+    plans = sm.plan_actions(host_tweets=[host], mentions=[quiet, popular, short], allow_daily=True, current_time=now)
+
+    assert [p.action_type for p in plans] == ["host", "daily", "mention", "mention"]
+    assert [p.target_tweet for p in plans[2:]] == [popular, quiet]
+    assert sm.decide_action(host, [quiet], True, now).action_type == "host"
+
+
+def test_queue_orders_by_priority_and_dedupes():
+    queue = ActionQueue()
+    assert queue.push(ActionPlan("mention", priority=100), key="a")
+    assert queue.push(ActionPlan("host", priority=300), key="b")
+    assert queue.push(ActionPlan("mention", priority=100, reason="segunda"), key="c")
+    assert not queue.push(ActionPlan("mention", priority=500), key="a")
+    assert [queue.pop().action_type, queue.pop().reason, queue.pop().reason] == ["host", "", "segunda"]
+    assert queue.pop() is None
+
+
+@pytest.mark.asyncio
+async def test_drain_respects_budget_and_runs_workers_in_parallel():
+    queue = ActionQueue()
+    for i in range(6):
+        queue.push(ActionPlan("mention", priority=-i, reason=str(i)), key=i)
+    active, peak, handled = 0, 0, []
+
+    async def handler(plan):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        handled.append(plan.reason)
+        return plan.reason != "1"
+
+    completed = await drain(queue, handler, workers=2, budget=4)
+    assert sorted(handled) == ["0", "1", "2", "3"]
+    assert completed == 3
+    assert peak == 2
+    assert len(queue) == 2
+
+
+@pytest.mark.asyncio
+async def test_drain_survives_handler_errors():
+    queue = ActionQueue()
+    queue.push(ActionPlan("host"), key="a")
+    queue.push(ActionPlan("mention"), key="b")
+
+    async def handler(plan):
+        if plan.action_type == "host":
+            raise RuntimeError("boom")
+        return True
+
+    assert await drain(queue, handler, workers=1, budget=5) == 1
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+
+import src.modules.x_client as xc
+
+ME = SimpleNamespace(id="1", screen_name="Bizarro")
+
+
+def notification(ts, tweet_id=None, author="2", text="hola @bizarro", reply_to=None):
+    tweet = None
+    if tweet_id:
+        tweet = SimpleNamespace(id=tweet_id, text=text, full_text=text, in_reply_to=reply_to,
+                                user=SimpleNamespace(id=author))
+    return SimpleNamespace(timestamp_ms=ts, tweet=tweet)
+
+
+def make_client(monkeypatch, first_page, watermark):
+    saved = {}
+
+    async def set_state(key, value):
+        saved[key] = value
+        return True
+
+    monkeypatch.setattr(xc, "set_state", set_state)
+    client = xc.XClient()
+    client.user = ME
+    client.mentions_watermark = watermark
+    client._mentions_loaded = True
+
+    async def get_notifications(type, count):
+        return first_page
+
+    client.client = SimpleNamespace(get_notifications=get_notifications)
+    return client, saved
+
+
+@pytest.mark.asyncio
+async def test_pages_only_through_new_notifications_and_filters_mentions(monkeypatch, fake_page):
+    older = fake_page([
+        notification(104, "t4", text="respuesta", reply_to="99"),
+        notification(100, "t0"),  # ya vista
+    ])
+    newest = fake_page([
+        notification(107, "t7"),
+        notification(106, "t6", author="1"),            # like sobre un tweet propio
+        notification(105, None),                         # follow
+    ], next_page=older)
+    client, _ = make_client(monkeypatch, newest, watermark=101)
+
+    mentions = await client.get_new_mentions()
+
+    assert [t.id for t in mentions] == ["t4", "t7"]
+
+
+@pytest.mark.asyncio
+async def test_watermark_stops_at_pending_mention(monkeypatch, fake_page):
+    page = fake_page([notification(3, "c"), notification(2, None), notification(1, "a")])
+    client, saved = make_client(monkeypatch, page, watermark=0)
+    await client.get_new_mentions()
+
+    await client.advance_mentions(pending_ids={"c"})
+    assert client.mentions_watermark == 2
+    assert saved[xc.MENTIONS_WATERMARK_KEY] == "2"
+
+    await client.advance_mentions(pending_ids=set())
+    assert client.mentions_watermark == 3